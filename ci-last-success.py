@@ -1,98 +1,642 @@
 #!/usr/bin/env python3
 """Outputs the SHA commit id of a successful CI job.
 
-Usage:  ci-last-success ORG REPO [CANDIDATE]
+Usage:  ci-last-success [options] ORG REPO [CANDIDATE]
 
 Outputs the SHA commit id corresponding to the most recent successful CI job
-that is CANDIDATE (a SHA hash) or earlier.
+that is CANDIDATE (a SHA hash) or earlier.  CANDIDATE defaults to HEAD.
+Earlier commits are its first-parent ancestors, which must be in the
+current git repository.
 Currently works only for Azure Pipelines.
 
+Options: --jobs=N means to look up the CI status of up to N commits at once:
+             the candidate and its nearest ancestors.  The default is 8.  The
+             result is the same as for --jobs=1, but up to N-1 extra requests
+             may be made for commits older than the result.
+         --cache=FILE means to remember the CI state of each commit in FILE,
+             across runs.  A commit whose CI job has finished (successfully
+             or not) is never looked up again.  A "pending" state is reused
+             for --pending-ttl seconds, then revalidated with a conditional
+             request, which GitHub does not count against the rate limit
+             if the state has not changed.  Runs that share FILE (say, in a
+             CI cache directory) share the states.  Without --cache (or with
+             the empty string), nothing is cached.
+         --pending-ttl=SECONDS is how long a cached "pending" state is
+             reused without a request; the default is 300.
+         --max-wait=SECONDS is how long to wait for the GitHub API rate limit
+             to reset, once it has been used up.  If the limit resets later,
+             the program prints when, and exits with status 2.  The default is
+             600.
+         --branch=BRANCH means to look up states in a listing of the GitHub
+             Actions workflow runs on BRANCH, 100 runs per request, instead of
+             with a request per commit.  A commit that is not in the first
+             --listing-pages pages of the listing (default 5) is looked up
+             on its own.  A commit's state is "success" if all its runs
+             succeeded (or were skipped), "pending" if any has not finished,
+             and otherwise "failure".  These states are not cached, since
+             they are not the commit statuses that other runs look up.
+         --debug means to print diagnostic output.
+
+Exits with status 0 if it finds a commit, 1 if no commit's CI job succeeded,
+and 2 if the rate limit was reached first.  Failed requests (5xx responses
+and connection errors) are retried a few times before giving up.  When few
+requests remain before the rate limit, the nearest ancestors are looked up
+first and fewer are looked up at once, so none are wasted on older commits.
+
+The GitHub API is at $GITHUB_API_URL, or https://api.github.com if that is
+not set.  (GitHub Actions sets GITHUB_API_URL; tests set it to a local server.)
+
 Requires the Python requests module to be installed, which you can do via:
   pip install requests
 """
 
 # This does no GitHub authentication, so it is limited to 60 requests per
-# hour.  It fails (and prints nothing to standard out, only to standard
-# error) if it goes over the limit.
+# hour.  Requests that GitHub answers with 304 (Not Modified), which the
+# cache makes, do not count.
 
+import argparse
+import collections
+import collections.abc
+import concurrent.futures
+import contextlib
+import json
+import os
+import random
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any
 
 import requests
 
-DEBUG = False
-# DEBUG=True
+# The default for --jobs.
+DEFAULT_JOBS = 8
+
+# The default for --max-wait.
+DEFAULT_MAX_WAIT = 600
+
+# How many times a request that fails with a 5xx status or a connection error is retried.
+RETRIES = 4
+
+# The first retry is after a random delay of up to this many seconds, and each later
+# retry waits up to twice as long as the previous one.
+BACKOFF_SECONDS = 1.0
+
+# The default for --listing-pages.
+DEFAULT_LISTING_PAGES = 5
+
+# The CI states that do not change once a commit has them.  The other state is "pending".
+TERMINAL_STATES = frozenset(["success", "failure", "error"])
+
+
+def main() -> None:
+    """Print the SHA of the most recent commit whose CI job succeeded."""
+    args = parse_args()
+    commit_arg = args.candidate
+    if commit_arg is None:
+        git_rev_parse_result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=False
+        )
+        if git_rev_parse_result.returncode == 0:
+            commit_arg = git_rev_parse_result.stdout.rstrip().decode("utf-8")
+        else:
+            raise Exception(git_rev_parse_result.stderr.decode("utf-8", errors="replace"))
+
+    if args.DEBUG:
+        print(f"commit_arg: {commit_arg}")
+
+    checker = StatusChecker(args.org, args.repo, args.jobs, args.max_wait, args.DEBUG)
+    if args.branch is not None:
+        checker.listing = RunListing(checker, args.branch, args.listing_pages)
+    if args.cache:
+        checker.cache = StatusCache(Path(args.cache), checker.repo_url, args.pending_ttl)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            with contextlib.closing(ancestors(commit_arg)) as commits:
+                result = last_success(checker, commits, executor, args.jobs, args.DEBUG)
+            if result is None:
+                print(f"No successful CI job found at or before {commit_arg}", file=sys.stderr)
+            else:
+                print(f"{result}", flush=True)
+        # Leaving the `with` statement waited for lookups that were already running when the
+        # result became known, so their states are cached too.
+    except RateLimitError as e:
+        print(f"{e}; try again then, or use a larger --max-wait", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        if checker.cache is not None:
+            checker.cache.save()
+    sys.exit(1 if result is None else 0)
 
-if len(sys.argv) != 3 and len(sys.argv) != 4:
-    print(
-        f"Wrong number of arguments {len(sys.argv) - 1}, expected 2 or 3",
-        file=sys.stderr,
+
+def parse_args() -> argparse.Namespace:
+    """Parse and return the command-line arguments.
+
+    Returns:
+        The parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Output the SHA commit id of the most recent successful CI job"
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="NUM_REQUESTS",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="look up the CI status of up to NUM_REQUESTS commits at once",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="CACHE_FILE",
+        dest="cache",
+        action="store",
+        default=None,
+        help="remember CI states in CACHE_FILE, across runs",
     )
-    sys.exit(2)
-
-org = sys.argv[1]
-repo = sys.argv[2]
-commit_arg = None
-if len(sys.argv) == 4:
-    commit_arg = sys.argv[3]
-else:
-    git_rev_parse_result = subprocess.run(
-        ["git", "rev-parse", "HEAD"], capture_output=True, check=False
+    parser.add_argument(
+        "--pending-ttl",
+        metavar="SECONDS",
+        dest="pending_ttl",
+        action="store",
+        type=float,
+        default=300,
+        help='how long to reuse a cached "pending" state without a request',
     )
-    if git_rev_parse_result.returncode == 0:
-        commit_arg = git_rev_parse_result.stdout.rstrip().decode("utf-8")
-    else:
-        raise Exception(git_rev_parse_result.stderr.decode("utf-8", errors="replace"))
+    parser.add_argument(
+        "--max-wait",
+        metavar="SECONDS",
+        dest="max_wait",
+        action="store",
+        type=float,
+        default=DEFAULT_MAX_WAIT,
+        help="how long to wait for the API rate limit to reset",
+    )
+    parser.add_argument(
+        "--branch",
+        metavar="BRANCH",
+        dest="branch",
+        action="store",
+        default=None,
+        help="look up states in a listing of the workflow runs on BRANCH",
+    )
+    parser.add_argument(
+        "--listing-pages",
+        metavar="NUM_PAGES",
+        dest="listing_pages",
+        action="store",
+        type=int,
+        default=DEFAULT_LISTING_PAGES,
+        help="read at most NUM_PAGES pages of the --branch listing",
+    )
+    parser.add_argument(
+        "--debug",
+        dest="DEBUG",
+        action="store_true",
+        default=False,
+        help="print diagnostic output",
+    )
+    parser.add_argument("org", metavar="ORG")
+    parser.add_argument("repo", metavar="REPO")
+    parser.add_argument("candidate", metavar="CANDIDATE", nargs="?", default=None)
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+class StatusChecker:
+    """Looks up the CI status of commits, over one pool of HTTP connections.
+
+    Its methods may be called from several threads at once.
+    """
+
+    def __init__(
+        self, org: str, repo: str, max_connections: int, max_wait: float, debug: bool = False
+    ) -> None:
+        """Create a StatusChecker for the GitHub repository ORG/REPO.
+
+        It waits up to `max_wait` seconds for the rate limit to reset.
+        """
+        api_url = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+        self.repo_url = f"{api_url}/repos/{org}/{repo}"
+        self.max_wait = max_wait
+        self.debug = debug
+        # The rate limit, as of the latest response:  the number of requests remaining, or
+        # None if no response has reported it (since it last reset), and the time when
+        # the limit resets.
+        self.rate_limit_lock = threading.Lock()
+        self.remaining: int | None = None
+        self.reset_time = 0.0
+        # Set when no more lookups are needed, to end waits and retries.
+        self.stopped = threading.Event()
+        # The CI states from previous runs, or None if they are not cached.
+        self.cache: StatusCache | None = None
+        # The listing of workflow runs, or None to look up each commit on its own.
+        self.listing: RunListing | None = None
+        # Reusing connections avoids a TCP and TLS handshake per request.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    ### PROBLEM: api.github.com is returning   "state": "pending"   for commits with completed CI
+    ### jobs.  Maybe I need to screen-scrape a different github.com page.  :-(
+    def successful(self, sha: str) -> bool:
+        """Return true if `sha`'s CI job succeeded.
+
+        Returns:
+            true if `sha`'s CI job succeeded.
+        """
+        return self.state(sha) == "success"
+
+    def state(self, sha: str) -> str:
+        """Return the state of `sha`'s CI job:  "success", "failure", "error", or "pending".
+
+        Uses the cache, if any.  Then uses the listing, if any, and looks up `sha` on
+        its own only if it is not in the listing.  Only states that are looked up on
+        their own are cached:  the listing gives the states of workflow runs, which
+        differ from a commit's combined status.
+
+        Returns:
+            the state of `sha`'s CI job.
+        """
+        cache = self.cache
+        cached = None if cache is None else cache.get(sha)
+        if cache is not None and cached is not None and cache.is_fresh(cached):
+            if self.debug:
+                print(f"cached: {sha} {cached['state']}")
+            return str(cached["state"])
+
+        if self.listing is not None:
+            listed = self.listing.state(sha)
+            if listed is not None:
+                if self.debug:
+                    print(f"listed: {sha} {listed}")
+                return listed
+
+        # message=commit['commit']['message']
+        url_status = f"{self.repo_url}/commits/{sha}/status"
+        if self.debug:
+            print(url_status)
+        headers = {}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        resp_status = self.get(url_status, headers)
+        if resp_status.status_code == 304 and cached is not None:
+            # The state has not changed since it was cached.
+            state = str(cached["state"])
+            etag = cached.get("etag")
+        elif resp_status.status_code == 200:
+            state = resp_status.json()["state"]
+            etag = resp_status.headers.get("ETag")
+        else:
+            # This means something went wrong.
+            msg = (
+                f"GET {url_status} {resp_status.status_code} {resp_status.headers}"
+                f" {resp_status.text}"
+            )
+            raise Exception(msg)
+        if cache is not None:
+            cache.put(sha, state, etag)
+        return state
+
+    def get(self, url: str, headers: dict[str, str]) -> requests.Response:
+        """Send a GET request, within the rate limit, and retry it if it fails transiently.
+
+        Raises RateLimitError if the rate limit resets more than `max_wait` seconds from now.
+
+        Returns:
+            the response, which may have any status except a rate-limit error.
+        """
+        failures = 0
+        while True:
+            if self.stopped.is_set():
+                raise concurrent.futures.CancelledError
+            self.wait_for_rate_limit()
+            try:
+                response = self.session.get(url, headers=headers, timeout=30)
+            except (requests.ConnectionError, requests.Timeout):
+                if failures == RETRIES:
+                    raise
+            else:
+                if self.note_rate_limit(response):
+                    continue
+                if response.status_code < 500 or failures == RETRIES:
+                    return response
+            failures += 1
+            # Random ("jittered") delays keep concurrent retries from arriving together.
+            delay = random.uniform(0, BACKOFF_SECONDS * 2 ** (failures - 1))
+            if self.debug:
+                print(f"retrying in {delay:.1f}s: {url}")
+            self.stopped.wait(delay)
+
+    def note_rate_limit(self, response: requests.Response) -> bool:
+        """Record the rate limit reported by `response`.
+
+        Returns:
+            true if `response` is an error because the rate limit was exceeded.
+        """
+        headers = response.headers
+        with self.rate_limit_lock:
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                remaining = int(headers["X-RateLimit-Remaining"])
+                reset_time = float(headers["X-RateLimit-Reset"])
+                # Concurrent responses arrive in any order, so within one window the
+                # smallest number remaining is the latest.
+                if self.remaining is None or reset_time > self.reset_time:
+                    self.remaining, self.reset_time = remaining, reset_time
+                elif reset_time == self.reset_time:
+                    self.remaining = min(self.remaining, remaining)
+            if response.status_code not in {403, 429}:
+                return False
+            if "Retry-After" in headers:
+                # A secondary rate limit, for too many requests at once.
+                self.remaining = 0
+                self.reset_time = time.time() + float(headers["Retry-After"])
+                return True
+            return self.remaining == 0
+
+    def wait_for_rate_limit(self) -> None:
+        """Wait until a request can be made, if the rate limit has been used up.
+
+        Raises RateLimitError if that would take more than `max_wait` seconds.
+        """
+        with self.rate_limit_lock:
+            if self.remaining == 0 and time.time() >= self.reset_time:
+                # The limit has reset.  The next response reports it, if the server does.
+                self.remaining = None
+            delay = self.reset_time - time.time() if self.remaining == 0 else 0
+            if delay > self.max_wait:
+                raise RateLimitError(self.reset_time)
+        if delay > 0:
+            if self.debug:
+                print(f"waiting {delay:.0f}s for the rate limit to reset")
+            self.stopped.wait(delay)
+
+    def stop(self) -> None:
+        """End waits and retries:  lookups in progress fail rather than make more requests."""
+        self.stopped.set()
+
+    def window(self, jobs: int) -> int:
+        """Return how many lookups to have in progress at once, given the rate limit.
+
+        If no response has reported the rate limit, as when the server does not report
+        one, there is taken to be none.
+
+        Returns:
+            at most `jobs`, and at most the number of requests remaining, but at least 1.
+        """
+        with self.rate_limit_lock:
+            if self.remaining is None:
+                return jobs
+            return max(1, min(jobs, self.remaining))
 
-if DEBUG:
-    print(f"commit_arg: {commit_arg}")
 
+class RateLimitError(Exception):
+    """The GitHub API rate limit was used up, and resets later than the caller will wait."""
 
-### PROBLEM: api.github.com is returning   "state": "pending"   for commits with completed CI jobs.
-### Maybe I need to screen-scrape a different github.com page.  :-(
-def successful(sha: str) -> bool:
-    """Return true if `sha`'s CI job succeeded.
+    def __init__(self, reset_time: float) -> None:
+        """Create a RateLimitError for a limit that resets at `reset_time`."""
+        reset = time.strftime("%H:%M:%S", time.localtime(reset_time))
+        super().__init__(f"GitHub API rate limit exceeded until {reset}")
+        self.reset_time = reset_time
+
+
+def last_success(
+    checker: StatusChecker,
+    commits: collections.abc.Iterator[str],
+    executor: concurrent.futures.Executor,
+    jobs: int,
+    debug: bool = False,
+) -> str | None:
+    """Return the first of `commits` whose CI job succeeded, or None if none did.
+
+    Up to `jobs` commits are looked up at once, in `executor`:  the earliest one whose
+    result is not yet known, and the ones after it.  Fewer are looked up at once when
+    few requests remain before the rate limit.  Once the result is known, lookups that
+    have not started are cancelled.
 
     Returns:
-        true if `sha`'s CI job succeeded.
+        the first of `commits` whose CI job succeeded, or None.
+    """
+    # The lookups in progress, in the order of `commits`.
+    pending: collections.deque[tuple[str, concurrent.futures.Future[bool]]] = collections.deque()
+    try:
+        while True:
+            while len(pending) < checker.window(jobs):
+                commit = next(commits, None)
+                if commit is None:
+                    break
+                if debug:
+                    print(f"Testing {commit}")
+                pending.append((commit, executor.submit(checker.successful, commit)))
+            if not pending:
+                return None
+            commit, future = pending.popleft()
+            if future.result():
+                return commit
+    finally:
+        # Lookups that are already running cannot be interrupted, but they make no more
+        # requests after the one in progress, if any.
+        for _, future in pending:
+            future.cancel()
+        checker.stop()
+
+
+def ancestors(commit: str) -> collections.abc.Iterator[str]:
+    """Yield the given commit, then its first parent, its first parent, and so on.
+
+    The ancestors come from one `git rev-list` process, which is read only as far as
+    they are needed, and is killed when the generator is closed.
+
+    Yields:
+        the given commit and its first-parent ancestors.
     """
-    # message=commit['commit']['message']
-    url_status = f"https://api.github.com/repos/{org}/{repo}/commits/{sha}/status"
-    if DEBUG:
-        print(url_status)
-    resp_status = requests.get(url_status, timeout=30)
-    if resp_status.status_code != 200:
-        # This means something went wrong, possibly rate-limiting.
-        msg = f"GET {url_status} {resp_status.status_code} {resp_status.headers} {resp_status.text}"
-        raise Exception(msg)
-    state = resp_status.json()["state"]
-    result: bool = state == "success"
-    return result
-
-
-def parent(sha: str) -> str | None:
-    """Return the SHA of the first parent of the given SHA.  Return None if this is the root.
+    yield commit
+    with subprocess.Popen(
+        ["git", "rev-list", "--first-parent", commit, "--"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    ) as rev_list:
+        try:
+            assert rev_list.stdout is not None
+            lines = iter(rev_list.stdout)
+            # The first line is `commit` itself.  If `commit` is not in the repository,
+            # there are no lines, and it is treated as the root.
+            next(lines, None)
+            for line in lines:
+                yield line.rstrip("\n")
+        finally:
+            rev_list.kill()
+
+
+### Listing
+
+# How many runs to ask for per page of a listing; GitHub's maximum.
+RUNS_PER_PAGE = 100
+
+
+class RunListing:
+    """The states of commits, from a listing of a branch's GitHub Actions workflow runs.
+
+    The listing is newest first, and is read a page at a time, as far as needed.
+    Its methods may be called from several threads at once.
+    """
+
+    def __init__(self, checker: StatusChecker, branch: str, max_pages: int) -> None:
+        """Create a RunListing for `branch`, that reads up to `max_pages` pages."""
+        self.checker = checker
+        self.max_pages = max_pages
+        query = urllib.parse.urlencode({"branch": branch, "per_page": RUNS_PER_PAGE})
+        # The URL of the next page to read, or None if there are no more.
+        self.next_url: str | None = f"{checker.repo_url}/actions/runs?{query}"
+        self.pages_read = 0
+        # Maps each commit SHA in the pages read so far to the states of its runs.
+        self.run_states: dict[str, list[str]] = {}
+        self.lock = threading.Lock()
+
+    def state(self, sha: str) -> str | None:
+        """Return the state of `sha`'s CI job, or None if `sha` is not in the listing.
+
+        Reads pages until it finds `sha`, or until there are no more pages to read.
+
+        Returns:
+            the state of `sha`'s CI job, or None.
+        """
+        with self.lock:
+            while sha not in self.run_states and self.read_page():
+                pass
+            run_states = self.run_states.get(sha)
+        if run_states is None:
+            return None
+        if "pending" in run_states:
+            return "pending"
+        if all(state == "success" for state in run_states):
+            return "success"
+        return "failure"
+
+    def read_page(self) -> bool:
+        """Read the next page of the listing, if there is one and the limit allows.
+
+        Returns:
+            true if a page was read.
+        """
+        if self.next_url is None or self.pages_read >= self.max_pages:
+            return False
+        if self.checker.debug:
+            print(self.next_url)
+        response = self.checker.get(self.next_url, {})
+        if response.status_code != 200:
+            msg = f"GET {self.next_url} {response.status_code} {response.headers} {response.text}"
+            raise Exception(msg)
+        self.pages_read += 1
+        self.next_url = response.links.get("next", {}).get("url")
+        for run in response.json()["workflow_runs"]:
+            self.run_states.setdefault(run["head_sha"], []).append(run_state(run))
+        return True
+
+
+def run_state(run: dict[str, Any]) -> str:
+    """Return the state of a workflow run:  "success", "failure", or "pending".
 
     Returns:
-        the SHA of the first parent of the given SHA, or None.
+        the state of the workflow run.
     """
-    get_parent_result = subprocess.run(
-        ["git", "rev-parse", sha + "^"], capture_output=True, check=False
-    )
-    if get_parent_result.returncode != 0:
-        return None
-    return get_parent_result.stdout.rstrip().decode("utf-8")
-
-
-commit = commit_arg
-while True:
-    if DEBUG:
-        print(f"Testing {commit}")
-    if successful(commit):
-        print(f"{commit}")
-        sys.exit(0)
-    the_parent = parent(commit)
-    if the_parent is None:
-        print(f"No successful CI job found at or before {commit_arg}", file=sys.stderr)
-        sys.exit(1)
-    commit = the_parent
+    if run["status"] != "completed":
+        return "pending"
+    if run["conclusion"] in {"success", "skipped", "neutral"}:
+        return "success"
+    return "failure"
+
+
+### Cache
+
+
+class StatusCache:
+    """The CI states of commits, kept in a file between runs.
+
+    The file is JSON:  it maps the API URL of each repository to a map from commit
+    SHAs to entries.  An entry has the commit's "state", the "etag" of the response
+    that gave it, and the "time" when that response was received or revalidated.
+    """
+
+    def __init__(self, path: Path, repo_url: str, pending_ttl: float) -> None:
+        """Read the cache for the repository at `repo_url`, from the file `path`."""
+        self.path = path
+        self.repo_url = repo_url
+        self.pending_ttl = pending_ttl
+        self.entries: dict[str, dict[str, Any]] = read_cache_file(path).get(repo_url, {})
+        # The entries that this run has added or changed.
+        self.updated: dict[str, dict[str, Any]] = {}
+        # `get` and `put` are called from several threads.
+        self.lock = threading.Lock()
+
+    def get(self, sha: str) -> dict[str, Any] | None:
+        """Return the entry for `sha`, or None if there is none.
+
+        Returns:
+            the entry for `sha`, or None.
+        """
+        with self.lock:
+            return self.entries.get(sha)
+
+    def is_fresh(self, entry: dict[str, Any]) -> bool:
+        """Return true if `entry` can be used without asking the server.
+
+        Returns:
+            true if `entry`'s state is terminal, or was fetched less than `pending_ttl` ago.
+        """
+        return entry["state"] in TERMINAL_STATES or time.time() - entry["time"] < self.pending_ttl
+
+    def put(self, sha: str, state: str, etag: str | None) -> None:
+        """Record the state of `sha`, just received from the server."""
+        entry = {"state": state, "etag": etag, "time": time.time()}
+        with self.lock:
+            self.entries[sha] = entry
+            self.updated[sha] = entry
+
+    def save(self) -> None:
+        """Write the cache file, if anything has changed.
+
+        The file is re-read first, so that entries written by concurrent runs are kept.
+        It is replaced atomically, so that a concurrent run never reads part of it.
+        """
+        with self.lock:
+            if not self.updated:
+                return
+            contents = read_cache_file(self.path)
+            entries = contents.setdefault(self.repo_url, {})
+            for sha, entry in self.updated.items():
+                if sha not in entries or entries[sha].get("time", 0) <= entry["time"]:
+                    entries[sha] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=self.path.name, delete=False
+            ) as temp:
+                json.dump(contents, temp)
+            Path(temp.name).replace(self.path)
+            self.updated = {}
+
+
+def read_cache_file(path: Path) -> dict[str, dict[str, dict[str, Any]]]:
+    """Return the contents of a cache file, or an empty cache if it is missing or unreadable.
+
+    Returns:
+        the contents of the cache file.
+    """
+    try:
+        contents = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return contents if isinstance(contents, dict) else {}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Filter warnings output to the changed lines of the working tree, using lint-diff-server.py."""
+
+# A fast replacement for `lint-diff.py --git-diff=HEAD` in pre-commit hooks
+# and editor save hooks.  It sends the warnings to lint-diff-server.py, which
+# keeps the changed lines of the working tree in memory.  If no server is
+# running, it runs `lint-diff.py --git-diff=HEAD` instead, with the same
+# result (unless the server was started with --base or --context).
+#
+# This program imports little, so that it starts quickly.
+#
+# Usage:  lint-diff-client.py [options] [warnings.txt]
+#         If warnings.txt is omitted, use standard input.
+#         lint-diff-client.py [--socket=FILE] --stop
+#         stops the server.
+# Output: as for lint-diff.py.
+# Options: --guess-strip, --strip-diff=N, and --strip-warnings=N are as for
+#              lint-diff.py.
+#          --socket=FILE is as for lint-diff-server.py.
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+from typing import BinaryIO
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))  # ruff:ignore[os-path-dirname]
+
+# How many bytes of the warnings to send at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+def main() -> None:
+    """Send the warnings to the server and print its response."""
+    args = parse_args()
+    socket_path = args.socket
+    if socket_path is None:
+        git_result = subprocess.run(
+            ["git", "rev-parse", "--absolute-git-dir"],
+            capture_output=True,
+            check=False,
+            text=True,
+        )
+        if git_result.returncode != 0:
+            print("lint-diff-client.py:", git_result.stderr.rstrip("\n"), file=sys.stderr)
+            sys.exit(2)
+        git_dir = git_result.stdout.rstrip("\n")
+        socket_path = os.path.join(git_dir, "lint-diff.sock")  # ruff:ignore[os-path-join]
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        # No server is running, or its socket can't be used (say, due to its permissions).
+        sock.close()
+        if args.stop:
+            sys.exit(0)
+        run_lint_diff(args)
+
+    with sock:
+        if args.stop:
+            request = {"command": "stop"}
+        else:
+            request = {
+                "name": args.warning_filename or "stdin",
+                "strip_diff": args.strip_diff,
+                "strip_warnings": args.strip_warnings,
+                "guess_strip": args.guess_strip,
+            }
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        if not args.stop:
+            if args.warning_filename is None:
+                send_file(sock, sys.stdin.buffer)
+            else:
+                with open(args.warning_filename, "rb") as warnings:  # ruff:ignore[builtin-open]
+                    send_file(sock, warnings)
+        sock.shutdown(socket.SHUT_WR)
+
+        status = 2
+        with sock.makefile("rb") as response:
+            for line in response:
+                record = json.loads(line)
+                # The text may contain bytes that are not valid UTF-8, as surrogates.
+                if "out" in record:
+                    sys.stdout.buffer.write(record["out"].encode("utf-8", "surrogateescape"))
+                elif "err" in record:
+                    sys.stderr.buffer.write(record["err"].encode("utf-8", "surrogateescape"))
+                elif "status" in record:
+                    status = record["status"]
+    sys.exit(status)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse and return the command-line arguments.
+
+    Returns:
+        The parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Filter warnings output to the changed lines of the working tree"
+    )
+    parser.add_argument(
+        "--guess-strip",
+        dest="guess_strip",
+        action="store_true",
+        default=False,
+        help="guess values for --strip-diff and --strip-warnings",
+    )
+    parser.add_argument(
+        "--strip-diff",
+        metavar="NUM_SLASHES",
+        dest="strip_diff",
+        action="store",
+        type=int,
+        default=0,
+        help="ignore NUM_SLASHES leading slashes in diff file names",
+    )
+    parser.add_argument(
+        "--strip-warnings",
+        metavar="NUM_SLASHES",
+        dest="strip_warnings",
+        action="store",
+        type=int,
+        default=0,
+        help="ignore NUM_SLASHES leading slashes in warning file names",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="SOCKET_FILE",
+        dest="socket",
+        action="store",
+        default=None,
+        help="the Unix socket of lint-diff-server.py; default: lint-diff.sock in .git",
+    )
+    parser.add_argument(
+        "--stop",
+        dest="stop",
+        action="store_true",
+        default=False,
+        help="stop the server",
+    )
+    parser.add_argument("warning_filename", metavar="WARNINGS", nargs="?", default=None)
+    args = parser.parse_args()
+    if args.guess_strip and (args.strip_diff != 0 or args.strip_warnings != 0):
+        parser.error("don't supply both --guess-strip and --strip-diff or --strip-warnings")
+    return args
+
+
+def send_file(sock: socket.socket, file: BinaryIO) -> None:
+    """Send the contents of a binary file over a socket."""
+    while chunk := file.read(CHUNK_SIZE):
+        sock.sendall(chunk)
+
+
+def run_lint_diff(args: argparse.Namespace) -> None:
+    """Replace this process with lint-diff.py, for when no server is running."""
+    lint_diff = os.path.join(SCRIPT_DIR, "lint-diff.py")  # ruff:ignore[os-path-join]
+    command = [sys.executable, lint_diff, "--git-diff=HEAD"]
+    if args.guess_strip:
+        command.append("--guess-strip")
+    if args.strip_diff:
+        command.append(f"--strip-diff={args.strip_diff}")
+    if args.strip_warnings:
+        command.append(f"--strip-warnings={args.strip_warnings}")
+    if args.warning_filename is not None:
+        command.append(args.warning_filename)
+    sys.stdout.flush()
+    os.execv(sys.executable, command)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""Keep the changed lines of a git working tree in memory, for lint-diff-client.py."""
+
+# A server for pre-commit hooks and editor save hooks that run lint-diff.py
+# many times.  Rather than parsing `git diff` and guessing strip values
+# afresh for each run, this server keeps the changed lines of the working
+# tree in memory and answers requests from lint-diff-client.py over a Unix
+# socket.  Before each request, it brings the changed lines up to date:  it
+# re-diffs only the files whose size or modification time has changed.
+#
+# Usage:  lint-diff-server.py [options]
+#         Run it in a git working tree.  It runs until it is stopped by
+#         `lint-diff-client.py --stop`, or until it is idle for --idle-timeout.
+# Options: --base=COMMIT is the commit to compare the working tree to, as
+#              in `git diff COMMIT`; the default is HEAD.  If COMMIT is
+#              a branch name such as HEAD, the server follows it as it moves.
+#          --context=N is as for lint-diff.py; the default is 2.
+#          --socket=FILE is the Unix socket to listen on; the default is
+#              lint-diff.sock in the .git directory.
+#          --idle-timeout=SECONDS means to exit after SECONDS without a
+#              request; the default is 3600.  0 means never to exit.
+#
+# Example use, in a pre-commit hook:
+#   lint-diff-server.py &
+#   ...
+#   (command-that-issues-warnings 2>&1) | lint-diff-client.py --guess-strip
+#
+# The protocol:  the client sends a line containing a JSON object, then (for
+# a filter request) the warnings.  The server sends lines containing JSON
+# objects:  {"out": TEXT} for each line of output, {"err": TEXT} for
+# each message to standard error, and finally {"status": STATUS}, where
+# STATUS is as for lint-diff.py.
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from lint_diff import (
+    ChangedLines,
+    LineRanges,
+    StripGuesser,
+    WarningFilter,
+    changed_lines,
+    decode_line,
+    decompress,
+    warning_filenames,
+)
+
+PROGRAM = Path(__file__).name
+
+# A file whose modification time is this close to the time it was diffed may be changed
+# again without its modification time changing, if the file system's timestamps are coarse.
+# Such a file is re-diffed for every request until it is older.
+RACY_NANOSECONDS = 2 * 1000 * 1000 * 1000
+
+# How many paths to pass to one `git diff` command.
+PATHS_PER_GIT_COMMAND = 500
+
+# How often, in seconds, the server checks whether it has been stopped or is idle.
+POLL_SECONDS = 0.5
+
+
+def main() -> None:
+    """Serve requests until stopped or idle."""
+    args = parse_args()
+    git_result = subprocess.run(
+        ["git", "rev-parse", "--absolute-git-dir", "--show-toplevel"],
+        capture_output=True,
+        check=False,
+        text=True,
+    )
+    if git_result.returncode != 0:
+        eprint(f"{PROGRAM}: {git_result.stderr.rstrip()}")
+        sys.exit(2)
+    git_dir, top_level = git_result.stdout.splitlines()
+    # Filenames in the diff, and in `git diff --name-only`, are relative to the top level.
+    os.chdir(top_level)
+    socket_path = args.socket or str(Path(git_dir) / "lint-diff.sock")
+
+    if Path(socket_path).exists():
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except OSError:
+            # No server is listening; a previous one did not clean up.
+            Path(socket_path).unlink()
+        else:
+            eprint(f"{PROGRAM}: a server is already listening on {socket_path}")
+            sys.exit(2)
+
+    working_tree = WorkingTreeDiff(args.base, args.context_lines)
+    # Compute the changed lines now, so that the first request is fast too.
+    try:
+        working_tree.refresh()
+    except RuntimeError as err:
+        # Say, --base is not a commit.
+        eprint(f"{PROGRAM}: {err}")
+        sys.exit(2)
+    with LintDiffServer(socket_path, working_tree) as server:
+        try:
+            server.serve(args.idle_timeout)
+        finally:
+            Path(socket_path).unlink(missing_ok=True)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse and return the command-line arguments.
+
+    Returns:
+        The parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Keep the changed lines of a git working tree in memory, for lint-diff-client"
+    )
+    parser.add_argument(
+        "--base",
+        metavar="COMMIT",
+        dest="base",
+        action="store",
+        default="HEAD",
+        help="the commit to compare the working tree to",
+    )
+    parser.add_argument(
+        "--context",
+        metavar="NUM_LINES",
+        dest="context_lines",
+        action="store",
+        type=int,
+        default=2,
+        help="how many lines around each changed one are also considered changed",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="SOCKET_FILE",
+        dest="socket",
+        action="store",
+        default=None,
+        help="the Unix socket to listen on; default: lint-diff.sock in .git",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        metavar="SECONDS",
+        dest="idle_timeout",
+        action="store",
+        type=float,
+        default=3600,
+        help="exit after SECONDS without a request; 0 means never",
+    )
+    return parser.parse_args()
+
+
+class Snapshot:
+    """The changed lines of the working tree at one moment, and data derived from them."""
+
+    __slots__ = ("changed", "guesser", "stripped")
+
+    def __init__(self, changed: ChangedLines) -> None:
+        """Create a Snapshot of the given changed lines."""
+        self.changed = changed
+        # The trie of diff filenames for --guess-strip, or None if it has not been needed yet.
+        self.guesser: StripGuesser | None = None
+        # Maps a --strip-diff value to the changed lines with that many directories stripped.
+        self.stripped: dict[int, ChangedLines] = {}
+
+    def new_guesser(self) -> StripGuesser:
+        """Return a StripGuesser for the changed files, that has seen no warning filenames.
+
+        Returns:
+            a StripGuesser for the changed files.
+        """
+        if self.guesser is None:
+            self.guesser = StripGuesser(self.changed.filenames())
+        return self.guesser.copy()
+
+    def strip(self, num_dirs: int) -> ChangedLines:
+        """Return the changed lines, with `num_dirs` leading directories stripped.
+
+        Returns:
+            the changed lines, with `num_dirs` leading directories stripped.
+        """
+        result = self.stripped.get(num_dirs)
+        if result is None:
+            result = self.changed.strip(num_dirs)
+            self.stripped[num_dirs] = result
+        return result
+
+
+class WorkingTreeDiff:
+    """The changed lines of `git diff BASE` for the working tree, kept up to date."""
+
+    def __init__(self, base: str, context_lines: int) -> None:
+        """Create a WorkingTreeDiff; its changed lines are computed by `refresh`."""
+        self.base = base
+        self.context_lines = context_lines
+        # The commit id that `base` referred to when the changed lines were computed.
+        self.base_commit: str | None = None
+        # Maps each path that differs from the base to its (size, modification time) when it
+        # was diffed (or None if it must be re-diffed), and its changed lines (or None if it
+        # has none, such as a deleted file).
+        self.paths: dict[str, tuple[tuple[int, int] | None, LineRanges | None]] = {}
+        self.snapshot = Snapshot(ChangedLines())
+        # `refresh` may be called by concurrent requests.
+        self.lock = threading.Lock()
+
+    def refresh(self) -> Snapshot:
+        """Bring the changed lines up to date, re-diffing only the files that changed.
+
+        Returns:
+            the up-to-date changed lines.
+        """
+        with self.lock:
+            base_commit = run_git(["rev-parse", "--verify", f"{self.base}^{{commit}}"]).rstrip()
+            if base_commit != self.base_commit:
+                self.base_commit = base_commit
+                self.paths = {}
+            now = time.time_ns()
+            differing = run_git(["diff", "--name-only", "-z", "--no-renames", base_commit]).split(
+                "\0"
+            )[:-1]
+            paths: dict[str, tuple[tuple[int, int] | None, LineRanges | None]] = {}
+            # Maps each path that must be re-diffed to its stat, taken before it is diffed.
+            dirty: dict[str, tuple[int, int] | None] = {}
+            for path in differing:
+                stat = path_stat(path, now)
+                old = self.paths.get(path)
+                if stat is not None and old is not None and old[0] == stat:
+                    paths[path] = old
+                else:
+                    dirty[path] = stat
+            if not dirty and paths.keys() == self.paths.keys():
+                return self.snapshot
+
+            for path, ranges in self.diff_paths(list(dirty), all_paths=not self.paths):
+                if path in dirty:
+                    paths[path] = (dirty[path], ranges)
+            for path, stat in dirty.items():
+                # A path with no hunks, such as one whose contents are unchanged after all.
+                paths.setdefault(path, (stat, None))
+            self.paths = paths
+
+            files = {f"b/{path}": ranges for path, (_, ranges) in paths.items() if ranges}
+            relative_diff = f"+++ {next(iter(files))}\n" if files else None
+            self.snapshot = Snapshot(ChangedLines(files, relative_diff))
+            return self.snapshot
+
+    def diff_paths(self, paths: list[str], all_paths: bool) -> list[tuple[str, LineRanges | None]]:
+        """Return the changed lines of the given paths.
+
+        If `all_paths` is true, `paths` is every path that differs from the base.
+
+        Returns:
+            pairs of a path and its changed lines (or None, if it has none).
+        """
+        command = [
+            "-c",
+            "core.quotePath=false",
+            "--literal-pathspecs",
+            "diff",
+            "--no-color",
+            "--no-ext-diff",
+            "--no-renames",
+            "--unified=0",
+            "--src-prefix=a/",
+            "--dst-prefix=b/",
+            str(self.base_commit),
+            "--",
+        ]
+        if all_paths:
+            path_groups = [[]]
+        else:
+            path_groups = [
+                paths[i : i + PATHS_PER_GIT_COMMAND]
+                for i in range(0, len(paths), PATHS_PER_GIT_COMMAND)
+            ]
+        result = []
+        for path_group in path_groups:
+            diff = run_git(command + path_group).splitlines(keepends=True)
+            for path, section in diff_sections(diff):
+                if path is None:
+                    # A quoted filename, which lint-diff.py cannot match to a warning either.
+                    continue
+                files, _ = changed_lines(section, self.context_lines)
+                result.append((path, files.get(f"b/{path}")))
+        return result
+
+
+def path_stat(path: str, now: int) -> tuple[int, int] | None:
+    """Return the size and modification time of a file, to tell whether it has changed.
+
+    `now` is the current time, in nanoseconds.
+
+    Returns:
+        the size and modification time of the file (-1 and -1 if it does not exist), or None
+        if it might change without its modification time changing.
+    """
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return (-1, -1)
+    if now - stat.st_mtime_ns < RACY_NANOSECONDS:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def diff_sections(
+    diff: list[str],
+) -> list[tuple[str | None, list[str]]]:
+    """Split a diff into the parts for each file.
+
+    Returns:
+        pairs of a path (or None if its filename is quoted) and the lines of the diff for it.
+    """
+    result: list[tuple[str | None, list[str]]] = []
+    for line in diff:
+        if line.startswith("diff --git "):
+            result.append((header_path(line), [line]))
+        elif result:
+            result[-1][1].append(line)
+    return result
+
+
+def header_path(header: str) -> str | None:
+    """Return the path in a "diff --git a/PATH b/PATH" line, for a diff without renames.
+
+    Returns:
+        the path, or None if the line is not of that form (say, because PATH is quoted).
+    """
+    prefix = "diff --git a/"
+    if not header.startswith(prefix):
+        return None
+    paths = header[len(prefix) :].rstrip("\n")
+    path = paths[: (len(paths) - len(" b/")) // 2]
+    if paths != f"{path} b/{path}":
+        return None
+    return path
+
+
+class LintDiffServer(socketserver.ThreadingUnixStreamServer):
+    """A server that filters warnings against the changed lines of a `WorkingTreeDiff`."""
+
+    daemon_threads = True
+    # `handle_request` returns after this many seconds without a request.
+    timeout = POLL_SECONDS
+
+    def __init__(self, socket_path: str, working_tree: WorkingTreeDiff) -> None:
+        """Create a server that listens on `socket_path`."""
+        super().__init__(socket_path, RequestHandler)
+        self.working_tree = working_tree
+        # True once a client has asked the server to stop.  The request that sets it is
+        # handled in another thread, so `serve` notices it within POLL_SECONDS.
+        self.stopped = False
+        # When the last request arrived, as from `time.monotonic`.
+        self.last_request_time = time.monotonic()
+
+    def serve(self, idle_timeout: float) -> None:
+        """Serve requests until a client stops the server, or until it is idle.
+
+        The server is idle if there has been no request for `idle_timeout` seconds.
+        If `idle_timeout` is 0, the server is never idle.
+        """
+        while not self.stopped:
+            self.handle_request()
+            if idle_timeout and time.monotonic() - self.last_request_time > idle_timeout:
+                return
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        """Note the time of the request, then handle it in a new thread."""
+        self.last_request_time = time.monotonic()
+        super().process_request(request, client_address)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handles one request from lint-diff-client.py."""
+
+    server: LintDiffServer
+
+    def handle(self) -> None:
+        """Read a request and send the response."""
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("command") == "stop":
+                self.server.stopped = True
+                status = 0
+            else:
+                status = self.filter_warnings(request)
+        except Exception as err:  # ruff:ignore[blind-except]
+            self.send({"err": f"{PROGRAM}: {err!r}\n"})
+            status = 2
+        self.send({"status": status})
+
+    def filter_warnings(self, request: dict[str, Any]) -> int:
+        """Send the lines of the request's warnings that are about changed lines.
+
+        Returns:
+            1 if this produced any output, 0 if not, as for lint-diff.py.
+        """
+        warning_lines = [decode_line(line) for line in decompress(self.rfile)]
+        snapshot = self.server.working_tree.refresh()
+
+        strip_diff = request.get("strip_diff", 0)
+        strip_warnings = request.get("strip_warnings", 0)
+        if request.get("guess_strip"):
+            guesser = snapshot.new_guesser()
+            for filename in warning_filenames(warning_lines):
+                guesser.add_warning_filename(filename)
+            guessed_strip = guesser.result()
+            if guessed_strip[0] != 1000:
+                strip_diff, strip_warnings = guessed_strip[:2]
+
+        # As in lint-diff.py, there is no warning about absolute paths if there is a more
+        # likely explanation:  the diff uses relative paths but --strip-diff is 0.
+        relative_diff_warned = snapshot.changed.relative_diff is not None and strip_diff == 0
+        warning_filter = WarningFilter(
+            snapshot.strip(strip_diff), strip_warnings, not relative_diff_warned
+        )
+        for line in warning_filter.filter(warning_lines):
+            self.send({"out": line})
+        if warning_filter.absolute_filename is not None:
+            self.send(
+                {
+                    "err": f"warning: git diff {self.server.working_tree.base} uses relative"
+                    f" paths but {request.get('name', 'stdin')} uses absolute paths\n"
+                }
+            )
+        return 1 if warning_filter.num_selected else 0
+
+    def send(self, record: dict[str, Any]) -> None:
+        """Send one line of the response."""
+        # json.dumps escapes non-ASCII characters, including surrogates for invalid UTF-8.
+        self.wfile.write(json.dumps(record).encode() + b"\n")
+
+
+def run_git(arguments: list[str]) -> str:
+    """Run git with the given arguments, and return its output.
+
+    Returns:
+        the standard output of git.
+    """
+    git_result = subprocess.run(["git", *arguments], capture_output=True, check=False)
+    if git_result.returncode != 0:
+        stderr = git_result.stderr.decode(errors="replace").rstrip()
+        msg = f"git {' '.join(arguments)} failed: {stderr}"
+        raise RuntimeError(msg)
+    return git_result.stdout.decode(errors="surrogateescape")
+
+
+def eprint(*args: object, **kwargs: Any) -> None:
+    """Print to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
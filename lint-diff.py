@@ -14,16 +14,54 @@
 # Example:
 #   Exception in thread "main" java.lang.IllegalAccessError
 
-# Usage:  lint-diff.py [options] diff.txt [warnings.txt]
+# Usage:  lint-diff.py [options] diff.txt [warnings.txt ...]
+#         lint-diff.py [options] --git-diff=RANGE [warnings.txt ...]
 #         If warnings.txt is omitted, use standard input.
+#         If diff.txt is "-", read the diff from standard input.
+#         diff.txt and warnings.txt may be compressed by gzip, bzip2, xz, or zstd
+#         (zstd requires Python 3.14 or the zstandard package); they are
+#         decompressed as they are read.
+#         If there are multiple warnings.txt files, the diff is read just once,
+#         and the warnings files are filtered concurrently.
 # Output: all lines in warnings.txt that are on a changed line.
 #         Output status is 1 if it produced any output, 0 if not, 2 if error.
+#         For multiple warnings.txt files, the output for each is printed in
+#         turn, followed by its status on standard error; the overall status
+#         is the largest of them.
 # Options: --guess-strip means guess values for --strip-diff and --strip-warnings.
+#              If the warnings are piped to standard input, the guess uses the
+#              filenames in the first part of the warnings, which are buffered
+#              until the guess is made; the rest are then filtered as they arrive.
+#          --guess-strip-window=N means that the guess for piped warnings uses
+#              the first N distinct filenames; the default is 1000.
 #          --strip-diff=N means to ignore N leading "/" in diff.txt.
 #          --strip-warnings=N means to ignore N leading "/" in warnings.txt.
 #              Affects matching, but not output, of lines.
 #          --context=N is how many lines adjacent to the changed ones
 #              are also considered changed; the default is 2.
+#          --git-diff=RANGE means to read the diff from `git diff RANGE`,
+#              as it is produced, instead of from diff.txt.
+#          --index=FILE means to read the changed lines from FILE instead of
+#              from diff.txt, if FILE is for the same diff and --context.
+#              Otherwise, read diff.txt and write FILE for use by later runs.
+#          --index-key=KEY identifies the diff for --index, e.g., by its
+#              commit range.  The default is diff.txt's size and modification time,
+#              or the commits of --git-diff's RANGE, which must then be of the form
+#              A..B (not, say, a single commit, whose diff with the working tree
+#              changes as the working tree does).
+#          --jobs=N means to split a (large) warnings file into chunks and
+#              filter them in N processes; the default is 1.  It has no effect
+#              when the warnings are read from standard input or are compressed.
+#          --format=FORMAT is the output format:  text (the default) outputs
+#              the selected lines of warnings.txt.  jsonl outputs a line of
+#              JSON for each selected warning (with its continuation lines),
+#              giving its filename (after --strip-warnings), line number,
+#              changed lines that contain it ("hunk", including context), and
+#              text.  sarif outputs a SARIF log.  Each warning is output as
+#              soon as it is found.  --jobs has no effect with jsonl or sarif.
+#          --stats means to print, to standard error, a line of JSON that
+#              reports the time, memory, and input size of each phase.
+#          --stats-file=FILE means to append that line of JSON to FILE.
 #          --debug means to print diagnostic output.
 
 # Here is how you could use this in continuous integration (Azure Pipelines,
@@ -39,6 +77,10 @@
 # (command-that-issues-warnings > /tmp/warnings.txt 2>&1) || true
 # /tmp/$USER/plume-scripts/ci-lint-diff /tmp/warnings.txt
 
+# To filter warnings within a Python program, without starting a new
+# process, import the `lint_diff` module (file lint_diff.py, in the same
+# directory as this script); see its documentation.
+
 # Implementation notes:
 # 1. It may be possible to achieve a similar result using diff (but not `git diff`):
 # https://unix.stackexchange.com/questions/34874/diff-output-line-numbers .
@@ -47,302 +89,475 @@
 
 import argparse
 import collections.abc
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import json
+import mmap
 import os
-import re
+import subprocess
 import sys
+import time
+from array import array
 from pathlib import Path
-from typing import Any
+from typing import Any, TextIO
+
+from lint_diff import (
+    INITIAL_WHITESPACE_RE,
+    ChangedLines,
+    CompressedInput,
+    LineRanges,
+    WarningFilter,
+    WarningRecord,
+    decode_input,
+    decode_line,
+    guess_strip_files,
+    guess_strip_stream,
+    input_lines,
+    open_input,
+)
 
 PROGRAM = Path(__file__).name
 
-DEBUG = False
-
-PLUSPLUSPLUS_RE = re.compile(r"\+\+\+ (\S*).*")
-
-# This cannot be multiline because files are read one line at a time.
-FILENAME_LINENO_RE = re.compile(r"([^:]*):([0-9]+):.*")
-
-INITIAL_WHITESPACE_RE = re.compile(r"[ \t]")
-
 
 def main() -> None:
     """Filter warnings output, to only show output for changed lines."""
     args = parse_args()
 
-    if args.warning_filename is not None:
-        warning_path = Path(args.warning_filename)
-        if warning_path.is_file() and warning_path.stat().st_size == 0:
-            sys.exit(0)
-
-    # A dictionary from file names to a set of ints (line numbers for changed lines).
-    changed = changed_lines(args)
-
-    if DEBUG:
-        for filename in sorted(changed):
-            print(filename, sorted(changed[filename]))
-
-    # True if a warning has been issued about relative directories.
-    relative_diff_warned = warn_relative_diff(args)
-
-    if args.warning_filename is None:
-        args.warning_filename = "stdin"
-        warnings = sys.stdin
+    # The diff is read only once, no matter how many warnings files there are.  Its file
+    # names are used both for guessing strip values and, once those are known, for
+    # matching warnings.
+    phases = None if args.stats is None else args.stats["phases"]
+    index = None
+    if args.index is not None:
+        with measure_phase(phases, "load_index") as phase:
+            index = load_index(args.index, index_key(args))
+            phase["found"] = index is not None
+    if index is not None:
+        diff_changed = index
+        if args.DEBUG:
+            eprint(f"lint-diff.py: read changed lines from index {args.index}")
     else:
-        # pylint: disable=consider-using-with
-        warnings = warning_path.open(encoding=encoding(warning_path))
-
-    # 1 if this produced any output, 0 if not.
-    status = 0
-    # true if we just printed a warning and are looking for continuation lines to print.
-    print_multiline_warning = False
-
-    for warning_line in warnings:
-        if print_multiline_warning and INITIAL_WHITESPACE_RE.match(warning_line):
-            print(warning_line, end="")
-            continue
-        print_multiline_warning = False
-
-        should_output = False
-
-        # Special case for Java exception in the output.
-        if warning_line.startswith("Exception in thread"):
-            should_output = True
-
-        match = FILENAME_LINENO_RE.match(warning_line)
-        if match:
-            try:
-                filename = strip_dirs(match.group(1), args.strip_warnings)
-            except TypeError:
-                filename = "warnings filename above common directory"
-                ## It's not an error; it just means this file doesn't appear in warnings output.
-                # eprint('Bad --strip-warnings={0} ; line has fewer "/": {1}'.format(
-                #   strip_warnings, match.group(1)))
-                # sys.exit(2)
-            if (
-                filename.startswith("/")
-                and args.relative_diff is not None
-                and args.strip_warnings == 0
-            ):
-                if not relative_diff_warned:
-                    eprint(
-                        # No spaces around string literals because this is `eprint`.
-                        "warning:",
-                        args.diff_filename,
-                        "uses relative paths but",
-                        args.warning_filename,
-                        "uses absolute paths",
-                    )
-                    relative_diff_warned = True
-            lineno = int(match.group(2))
-            if filename in changed and lineno in changed[filename]:
-                should_output = True
-
-        if should_output:
-            print(warning_line, end="")
-            status = 1
-            print_multiline_warning = True
-
-    if warnings is not sys.stdin:
-        warnings.close()
-
+        with measure_phase(phases, "diff") as phase:
+            diff = diff_lines(args)
+            if phases is not None:
+                diff = counted_lines(diff, phase, count_hunks=True)
+            diff_changed = ChangedLines.from_lines(diff, args.context_lines)
+            if args.git_diff is not None:
+                phase["git_peak_rss_bytes"] = peak_rss_bytes(children=True)
+        if args.index is not None:
+            with measure_phase(phases, "save_index"):
+                save_index(args.index, index_key(args), diff_changed)
+    if args.stats is not None:
+        args.stats["changed_lines"] = changed_lines_stats(diff_changed)
+
+    if args.format == "sarif":
+        print(SARIF_HEADER, end="")
+    if len(args.warning_filenames) > 1:
+        status = filter_warnings_files(args, diff_changed)
+    else:
+        args.warning_filename = args.warning_filenames[0] if args.warning_filenames else None
+        status = filter_warnings_file(args, diff_changed, sys.stdout)
+        if args.stats is not None and args.file_stats is not None:
+            args.file_stats["status"] = status
+            args.stats["warnings_files"].append(args.file_stats)
+    if args.format == "sarif":
+        print(SARIF_FOOTER, end="")
+
+    if args.stats is not None:
+        output_stats(args)
     sys.exit(status)
 
 
-def eprint(*args: object, **kwargs: Any) -> None:
-    """Print to stderr."""
-    print(*args, file=sys.stderr, **kwargs)
+def filter_warnings_files(args: argparse.Namespace, diff_changed: ChangedLines) -> int:
+    """Filter each of `args.warning_filenames` against the same diff, concurrently.
 
-
-def strip_dirs(filename: str, num_dirs: int) -> str:
-    """Strip off `num_dirs` leading "/" characters.
+    Each file's output is printed in the order that the files were given,
+    followed by a line on standard error that reports that file's status.
+    Strip values are guessed separately for each file, because different
+    tools may print filenames differently.
 
     Returns:
-        A subdirectory, with `num_dirs` top-level enclosing directories removed.
+        the largest status of any of the warnings files.
     """
-    if num_dirs == 0:
-        return filename
-    return os.path.join(*(filename.split(os.path.sep)[num_dirs:]))  # ruff:ignore[os-path-join]
+    max_workers = min(len(args.warning_filenames), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = []
+        for warning_filename in args.warning_filenames:
+            file_args = argparse.Namespace(**vars(args))
+            file_args.warning_filename = warning_filename
+            futures.append(executor.submit(filter_warnings_file_to_string, file_args, diff_changed))
+        result = 0
+        # True if a SARIF run has been printed, so the next one must be preceded by a comma.
+        printed_run = False
+        for warning_filename, future in zip(args.warning_filenames, futures, strict=True):
+            try:
+                output, status, file_stats = future.result()
+            except Exception as err:  # ruff:ignore[blind-except]
+                output = ""
+                status = 2
+                file_stats = None
+                eprint(f"{PROGRAM}: error while filtering {warning_filename}: {err!r}")
+            if args.format == "sarif" and output:
+                if printed_run:
+                    output = SARIF_RUN_SEPARATOR + output
+                printed_run = True
+            print(output, end="", flush=True)
+            eprint(f"{PROGRAM}: status {status} for {warning_filename}")
+            if args.stats is not None and file_stats is not None:
+                file_stats["status"] = status
+                args.stats["warnings_files"].append(file_stats)
+            result = max(result, status)
+    return result
 
 
-## Tests:
-"""
-import os
-assert strip_dirs("/a/b/c/d", 0) == '/a/b/c/d'
-assert strip_dirs("/a/b/c/d", 1) == 'a/b/c/d'
-assert strip_dirs("/a/b/c/d", 2) == 'b/c/d'
-assert strip_dirs("/a/b/c/d", 3) == 'c/d'
-assert strip_dirs("/a/b/c/d", 4) == 'd'
-assert strip_dirs("/a/b/c/", 0) == '/a/b/c/'
-assert strip_dirs("/a/b/c/", 1) == 'a/b/c/'
-assert strip_dirs("/a/b/c/", 2) == 'b/c/'
-assert strip_dirs("/a/b/c/", 3) == 'c/'
-assert strip_dirs("/a/b/c/", 4) == ''
-"""
-
-
-def min_strips(filename1: str, filename2: str) -> tuple[int, int, str, str]:
-    """Find matching suffixes of the given filenames.
-
-    Returns a 4-tuple of 2 integers and 2 strings.  The integers
-    indicate the smallest strip values that make the two filenames equal,
-    or a maximal pair if the files have different basenames.  The last two
-    elements of the tuple are the argument strings.
+def filter_warnings_file_to_string(
+    args: argparse.Namespace, diff_changed: ChangedLines
+) -> tuple[str, int, dict[str, Any] | None]:
+    """Call `filter_warnings_file`, in a worker process.
 
     Returns:
-        A 4-tuple of 2 integers and 2 strings.
+        the output and the status of `filter_warnings_file`, and its measurements for
+        --stats (or None).
     """
-    components1 = filename1.split(os.path.sep)
-    components2 = filename2.split(os.path.sep)
-    if components1[-1] != components2[-1]:
-        ## TODO: is this special case necessary?
-        return (1000, 1000, filename1, filename2)
-    while components1 and components2 and components1[-1] == components2[-1]:
-        del components1[-1]
-        del components2[-1]
-    return (len(components1), len(components2), filename1, filename2)
-
-
-## Tests:
-"""
-import os
-assert min_strips("/a/b/c/d", "/a/b/c/d") == (0, 0, "/a/b/c/d", "/a/b/c/d")
-assert min_strips("e1/e2/a/b/c/d", "/a/b/c/d") == (2, 1, "e1/e2/a/b/c/d", "/a/b/c/d")
-assert min_strips("/e1/e2/a/b/c/d", "/a/b/c/d") == (3, 1, "/e1/e2/a/b/c/d", "/a/b/c/d")
-assert min_strips("e1/e2/a/b/c/d", "a/b/c/d") == (2, 0, "e1/e2/a/b/c/d", "a/b/c/d")
-assert min_strips("/e1/e2/a/b/c/d", "a/b/c/d") == (3, 0, "/e1/e2/a/b/c/d", "a/b/c/d")
-assert min_strips("/a/b/c/d", "/e/f/g/h") == (1000, 1000, "/a/b/c/d", "/e/f/g/h")
-"""
+    output = io.StringIO()
+    status = filter_warnings_file(args, diff_changed, output)
+    return output.getvalue(), status, args.file_stats
 
 
-def pair_min(
-    pair1: tuple[int, int, str, str], pair2: tuple[int, int, str, str]
-) -> tuple[int, int, str, str]:
-    """Given two tuples, returns the one that is pointwise lesser in its first two elements.
+def filter_warnings_file(args: argparse.Namespace, diff_changed: ChangedLines, out: TextIO) -> int:
+    """Write, to `out`, the lines of `args.warning_filename` that are about changed lines.
 
-    Fails if neither is lesser.
+    `diff_changed` is the changed lines of the diff, before stripping.  If `args.warning_filename`
+    is None, read standard input.  May set `args.strip_diff` and `args.strip_warnings`.
 
     Returns:
-        the argument that is pointwise lesser in its first two elements.
+        1 if this produced any output, 0 if not.
     """
-    if pair1[0] <= pair2[0] and pair1[1] <= pair2[1]:
-        return pair1
-    if pair1[0] >= pair2[0] and pair1[1] >= pair2[1]:
-        return pair2
-    msg = f"incomparable pairs: {pair1} {pair2}"
-    raise Exception(msg)
+    if args.warning_filename is not None:
+        warning_path = Path(args.warning_filename)
+        if warning_path.is_file() and warning_path.stat().st_size == 0:
+            return 0
 
+    if args.warning_filename is None:
+        args.warning_filename = "stdin"
+    # Measurements for --stats, or None.
+    args.file_stats = (
+        None if args.stats is None else {"warnings_file": args.warning_filename, "phases": {}}
+    )
+    phases = None if args.file_stats is None else args.file_stats["phases"]
 
-## Tests:
-"""
-import os
-assert pair_min((3,4,"a","b"), (5,6,"c","d")) == (3,4,"a","b")
-assert pair_min((4,3,"a","b"), (6,5,"c","d")) == (4,3,"a","b")
-assert pair_min((30,40,"a","b"), (5,6,"c","d")) == (5,6,"c","d")
-assert pair_min((40,30,"a","b"), (6,5,"c","d")) == (6,5,"c","d")
-"""
+    if args.warning_filename == "stdin":
+        warnings = open_stdin()
+    else:
+        # pylint: disable=consider-using-with
+        warnings = open_input(args.warning_filename)
 
+    warning_lines = input_lines(warnings)
 
-def diff_filenames(diff_filename: str) -> set[str]:
-    """All the filenames in the given diff file.
+    if args.guess_strip:
+        with measure_phase(phases, "guess_strip") as phase:
+            if warnings.seekable():
+                guessed_strip = guess_strip_files(diff_changed.filenames(), warnings, args.DEBUG)
+            else:
+                # The warnings cannot be read twice, as when they are piped to standard input.
+                guessed_strip, warning_lines = guess_strip_stream(
+                    diff_changed.filenames(), warning_lines, args.guess_strip_window
+                )
+            phase["strip_diff"], phase["strip_warnings"] = guessed_strip[:2]
+        if guessed_strip[0] == 1000:
+            if args.DEBUG:
+                eprint(
+                    "lint-diff.py: --guess-strip failed to guess values (maybe no files in common?)"
+                )
+        else:
+            args.strip_diff = guessed_strip[0]
+            args.strip_warnings = guessed_strip[1]
+            if args.DEBUG:
+                eprint(
+                    "lint-diff.py inferred "
+                    f"--strip-diff={args.strip_diff} --strip-warnings={args.strip_warnings}"
+                )
 
-    Returns:
-        All the filenames in the given diff file.
+    changed = diff_changed.strip(args.strip_diff)
+
+    if args.DEBUG:
+        for filename in sorted(changed.files):
+            print(filename, changed.files[filename], file=out)
+
+    # True if a warning has been issued about relative directories.
+    relative_diff_warned = warn_relative_diff(args, changed, warnings)
+
+    with measure_phase(phases, "filter") as phase:
+        if (
+            args.jobs > 1
+            and args.format == "text"
+            and args.warning_filename != "stdin"
+            and warnings.seekable()
+            # The chunks are split at newlines in the file, so it must not be compressed.
+            and not isinstance(warnings, CompressedInput)
+        ):
+            warnings.close()
+            num_output_lines = filter_file_in_parallel(
+                args, changed, relative_diff_warned, out, phase
+            )
+        else:
+            if phases is not None:
+                warning_lines = counted_lines(warning_lines, phase)
+            warning_filter = WarningFilter(changed, args.strip_warnings, not relative_diff_warned)
+            if args.format == "text":
+                out.writelines(warning_filter.filter(warning_lines))
+            else:
+                write_records(args, warning_filter.records(warning_lines), out)
+            warn_absolute_filename(args, warning_filter.absolute_filename)
+            num_output_lines = warning_filter.num_selected
+            if args.warning_filename != "stdin":
+                warnings.close()
+        phase["lines_output"] = num_output_lines
+        if "lines_read" in phase:
+            phase["lines_rejected"] = phase["lines_read"] - num_output_lines
+
+    return 1 if num_output_lines else 0
+
+
+def warn_absolute_filename(args: argparse.Namespace, absolute_filename: str | None) -> None:
+    """Warn if a warning has an absolute filename although the diff's filenames are relative.
+
+    `absolute_filename` is that of a `WarningFilter`.
     """
-    result = set()
-    with Path(diff_filename).open(encoding=encoding(diff_filename)) as diff:
-        for diff_line in diff:
-            match = PLUSPLUSPLUS_RE.match(diff_line)
-            if match:
-                filename: str = match.group(1)
-                if filename != "/dev/null":
-                    result.add(filename)
-    return result
+    if absolute_filename is not None:
+        eprint(
+            # No spaces around string literals because this is `eprint`.
+            "warning:",
+            args.diff_name,
+            "uses relative paths but",
+            args.warning_filename,
+            "uses absolute paths",
+        )
+
+
+### Machine-readable output
+
+# The SARIF output is a log with one run per warnings file.  These strings are the parts
+# of the log other than the runs, so that the runs can be output as they are produced.
+SARIF_HEADER = (
+    '{"version": "2.1.0", "$schema": "https://json.schemastore.org/sarif-2.1.0.json", "runs": [\n'
+)
+SARIF_RUN_SEPARATOR = ",\n"
+SARIF_FOOTER = "\n]}\n"
+
+
+def write_records(
+    args: argparse.Namespace, records: collections.abc.Iterable[WarningRecord], out: TextIO
+) -> None:
+    """Write, to `out`, the selected warnings in the format given by --format.
+
+    For --format=jsonl, each warning is a line of JSON.  For --format=sarif, the warnings
+    are one SARIF run, for `args.warning_filename`.  Each warning is written (and flushed)
+    as soon as it is selected.
+    """
+    if args.format == "jsonl":
+        for record in records:
+            json_record = {
+                "warnings_file": args.warning_filename,
+                "filename": record.filename,
+                "line": record.lineno,
+                "hunk": record.hunk and list(record.hunk),
+                "text": record.text(),
+            }
+            out.write(json.dumps(json_record) + "\n")
+            out.flush()
+        return
+
+    run_properties = {"warningsFile": args.warning_filename, "diff": args.diff_name}
+    out.write(
+        '{"tool": {"driver": {"name": "lint-diff.py", '
+        '"informationUri": "https://github.com/plume-lib/plume-scripts"}}, '
+        f'"properties": {json.dumps(run_properties)}, "results": [\n'
+    )
+    separator = ""
+    for record in records:
+        out.write(separator + json.dumps(sarif_result(record)))
+        out.flush()
+        separator = ",\n"
+    out.write("\n]}")
 
 
-def warning_filenames(warning_filename: str) -> set[str]:
-    """All the filenames in the given warning file.
+def sarif_result(record: WarningRecord) -> dict[str, Any]:
+    """Return a SARIF result for a selected warning.
 
     Returns:
-        All the filenames in the given warning file.
+        a SARIF result for the warning.
     """
-    result = set()
-    with Path(warning_filename).open(encoding=encoding(warning_filename)) as warnings:
-        for warning_line in warnings:
-            match = FILENAME_LINENO_RE.match(warning_line)
-            if match:
-                # lstrip is necessary because after Gradle outputs all warnings,
-                # it prints "> Compilation failed; see the compiler output
-                # below." and then prints one warning, indented by two spaces.
-                result.add(match.group(1).lstrip())
+    result: dict[str, Any] = {"message": {"text": record.text()}}
+    if record.filename is not None and record.lineno is not None:
+        physical_location: dict[str, Any] = {
+            "artifactLocation": {"uri": record.filename},
+            "region": {"startLine": record.lineno},
+        }
+        if record.hunk is not None:
+            physical_location["contextRegion"] = {
+                "startLine": record.hunk[0],
+                "endLine": record.hunk[1],
+            }
+        result["locations"] = [{"physicalLocation": physical_location}]
     return result
 
 
-def guess_strip_filenames(
-    diff_filenames: set[str], warning_filenames: set[str]
-) -> tuple[int, int, str, str]:
-    """Match subdirectory structure.
+### Parallel filtering
 
-    Arguments are two lists of file names.
-
-    Returns:
-        A 4-tuple of 2 integers and 2 strings, as for `min_strips`.
-    """
-    result = (1000, 1000, "no files seen yet", "no files seen yet")
-    for diff_filename in diff_filenames:
-        for warning_filename in warning_filenames:
-            result = pair_min(result, min_strips(diff_filename, warning_filename))
-    return result
+# Each worker process for `filter_file_in_parallel` reads a different chunk of the warnings
+# file.  Memory use is proportional to the chunk size, not to the size of the file.
+PARALLEL_CHUNK_SIZE = 64 * 1024 * 1024
 
 
-def guess_strip_files(diff_file: str, warning_file: str) -> tuple[int, int, str, str]:
-    """Match subdirectory structure.
+def filter_file_in_parallel(
+    args: argparse.Namespace,
+    changed: ChangedLines,
+    relative_diff_warned: bool,
+    out: TextIO,
+    phase: dict[str, Any],
+) -> int:
+    """Like `WarningFilter`, but filters chunks of the warnings file in `args.jobs` processes.
 
-    Arguments are files produced by diff and a lint tool, respectively.
+    The output is the same as that of `WarningFilter`, in the same order.  The number
+    of lines and bytes read are recorded in `phase`, as by `counted_lines`.
 
     Returns:
-        A 4-tuple of 2 integers and 2 strings, as for `min_strips`.
+        the number of lines output.
     """
-    diff_files = diff_filenames(diff_file)
-    warning_files = warning_filenames(warning_file)
-    result = guess_strip_filenames(diff_files, warning_files)
-    diff_prefix = commonpath(diff_files)
-    try:
-        warnings_prefix = commonpath(warning_files)
-    except ValueError:
-        with Path.open(Path(warning_file)) as file:
-            for line in file:
-                # rstrip is necessary because eprint adds a newline.
-                eprint(line.rstrip())
-        raise
-    if result[0] > diff_prefix.count("/") or result[1] > warnings_prefix.count("/"):
-        # This is not necessarily a problem.  It is possible that all the
-        # diffs, or all the lint output, happens to be in one subdirectory.
-        if DEBUG:
-            eprint(
-                "lint-diff.py: guess_strip_files all in one subdirectory: "
-                f"result={result} diff_prefix={diff_prefix} warnings_prefix={warnings_prefix}"
+    with (
+        Path(args.warning_filename).open("rb") as warnings,
+        mmap.mmap(warnings.fileno(), 0, access=mmap.ACCESS_READ) as warnings_map,
+    ):
+        size = len(warnings_map)
+        num_chunks = max(args.jobs, -(-size // PARALLEL_CHUNK_SIZE))
+        # Split the file just after a newline, so that no line spans two chunks.
+        boundaries = [0]
+        for chunk_index in range(1, num_chunks):
+            newline = warnings_map.find(
+                b"\n", max(boundaries[-1], size * chunk_index // num_chunks)
             )
-            eprint(f"diff_files={diff_files}")
-            eprint(f"warning_files={warning_files}")
-    return result
+            if newline == -1:
+                break
+            boundaries.append(newline + 1)
+        boundaries.append(size)
+    chunks = [(start, end) for start, end in itertools.pairwise(boundaries) if start < end]
+
+    num_output_lines = 0
+    num_lines = 0
+    # True if the last chunk ended in an output warning, as for `WarningFilter.continuing`.
+    continuing = False
+    absolute_filename = None
+    with concurrent.futures.ProcessPoolExecutor(
+        args.jobs,
+        initializer=init_chunk_worker,
+        initargs=(args, changed, relative_diff_warned),
+    ) as executor:
+        for (
+            leading_lines,
+            leading_filtered,
+            output,
+            chunk_output_lines,
+            chunk_continuing,
+            chunk_absolute_filename,
+            chunk_lines,
+        ) in executor.map(filter_chunk, chunks):
+            # Only the worker knows which lines at the start of its chunk start with
+            # whitespace; only now is it known whether they continue an output warning.
+            # If they don't, they are filtered like any other lines.
+            if continuing:
+                out.write(leading_lines)
+                num_output_lines += leading_lines.count("\n")
+            else:
+                leading_output, leading_output_lines, leading_continuing, leading_absolute = (
+                    leading_filtered
+                )
+                out.write(leading_output)
+                num_output_lines += leading_output_lines
+                continuing = leading_continuing
+                if absolute_filename is None:
+                    absolute_filename = leading_absolute
+            out.write(output)
+            num_output_lines += chunk_output_lines
+            num_lines += chunk_lines
+            if chunk_continuing is not None:
+                continuing = chunk_continuing
+            if absolute_filename is None:
+                absolute_filename = chunk_absolute_filename
+    warn_absolute_filename(args, absolute_filename)
+    phase["lines_read"] = num_lines
+    phase["bytes_read"] = size
+    return num_output_lines
+
+
+# The arguments of `init_chunk_worker`, in a worker process.
+CHUNK_WORKER_STATE: tuple[argparse.Namespace, ChangedLines, bool] | None = None
+
+
+def init_chunk_worker(
+    args: argparse.Namespace, changed: ChangedLines, relative_diff_warned: bool
+) -> None:
+    """Record, in a worker process, the arguments that are the same for every chunk.
+
+    This avoids sending the changed lines to the worker process with each chunk.
+    """
+    global CHUNK_WORKER_STATE
+    CHUNK_WORKER_STATE = (args, changed, relative_diff_warned)
 
 
-def commonpath(files: collections.abc.Iterable[str]) -> str:
-    """Return the common prefix of the given paths.
+def filter_chunk(
+    chunk: tuple[int, int],
+) -> tuple[str, tuple[str, int, bool, str | None], str, int, bool | None, str | None, int]:
+    """Filter the bytes of the warnings file from `chunk[0]` up to `chunk[1]`.
 
-    Argument is a set or list of paths.
+    Runs in a worker process initialized by `init_chunk_worker`.
 
     Returns:
-         the common prefix of the given paths.
+        the lines at the start of the chunk that start with whitespace, which are all
+        output if the preceding chunk ended in an output warning; the result of
+        filtering them if it did not (their output, its number of lines, whether they
+        end in an output warning, and the `absolute_filename` of the `WarningFilter`);
+        the output for the rest of the chunk, and its number of lines; whether the chunk
+        ends in an output warning, or None if all its lines start with whitespace; the
+        `absolute_filename` of the `WarningFilter`; and the number of lines in the chunk.
     """
-    if not files:
-        return ""
-    try:
-        # Remove leading null characters.
-        files_list = [file.lstrip("\0") for file in files]
-        return os.path.commonpath(files_list)
-    except ValueError as err:
-        raise ValueError(str(files)) from err
+    assert CHUNK_WORKER_STATE is not None
+    args, changed, relative_diff_warned = CHUNK_WORKER_STATE
+    with (
+        Path(args.warning_filename).open("rb") as warnings,
+        mmap.mmap(warnings.fileno(), 0, access=mmap.ACCESS_READ) as warnings_map,
+    ):
+        chunk_bytes = warnings_map[chunk[0] : chunk[1]]
+    # Split lines the same way that a file opened in text mode does.
+    lines = [decode_line(line) for line in chunk_bytes.splitlines(keepends=True)]
+    num_leading = 0
+    while num_leading < len(lines) and INITIAL_WHITESPACE_RE.match(lines[num_leading]):
+        num_leading += 1
+    leading_filter = WarningFilter(changed, args.strip_warnings, not relative_diff_warned)
+    leading_output = "".join(leading_filter.filter(lines[:num_leading]))
+    warning_filter = WarningFilter(changed, args.strip_warnings, not relative_diff_warned)
+    output = "".join(warning_filter.filter(lines[num_leading:]))
+    return (
+        "".join(lines[:num_leading]),
+        (
+            leading_output,
+            leading_filter.num_selected,
+            leading_filter.continuing,
+            leading_filter.absolute_filename,
+        ),
+        output,
+        warning_filter.num_selected,
+        warning_filter.continuing if num_leading < len(lines) else None,
+        warning_filter.absolute_filename,
+        len(lines),
+    )
+
+
+def eprint(*args: object, **kwargs: Any) -> None:
+    """Print to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
 
 
 ### Main routine
@@ -354,8 +569,6 @@ def parse_args() -> argparse.Namespace:
     Returns:
         The parsed command-line arguments.
     """
-    global DEBUG
-
     parser = argparse.ArgumentParser(
         description="Filter warnings output, to only show output for changed lines"
     )
@@ -366,6 +579,15 @@ def parse_args() -> argparse.Namespace:
         default=False,
         help="guess values for --strip-diff and --strip-warnings",
     )
+    parser.add_argument(
+        "--guess-strip-window",
+        metavar="NUM_FILES",
+        dest="guess_strip_window",
+        action="store",
+        type=int,
+        default=1000,
+        help="when the warnings cannot be read twice, guess from the first NUM_FILES filenames",
+    )
     parser.add_argument(
         "--strip-diff",
         metavar="NUM_SLASHES",
@@ -403,14 +625,107 @@ def parse_args() -> argparse.Namespace:
         default=2,
         help="how many lines around each changed one are also considered changed",
     )
+    parser.add_argument(
+        "--index",
+        metavar="INDEX_FILE",
+        dest="index",
+        action="store",
+        default=None,
+        help="read the changed lines from INDEX_FILE if it is up to date, else write it",
+    )
+    parser.add_argument(
+        "--index-key",
+        metavar="KEY",
+        dest="index_key",
+        action="store",
+        default=None,
+        help="identifies the diff, such as its commit range; default: the diff file's size and"
+        " modification time",
+    )
+    parser.add_argument(
+        "--git-diff",
+        metavar="RANGE",
+        dest="git_diff",
+        action="store",
+        default=None,
+        help="read the diff from `git diff RANGE` rather than from diff.txt,"
+        " which must then be omitted",
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="NUM_PROCESSES",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="filter a warnings file in chunks, in NUM_PROCESSES processes",
+    )
+    parser.add_argument(
+        "--format",
+        dest="format",
+        action="store",
+        choices=["text", "jsonl", "sarif"],
+        default="text",
+        help="output the selected warnings as text, one JSON object per warning, or SARIF",
+    )
+    parser.add_argument(
+        "--stats",
+        dest="print_stats",
+        action="store_true",
+        default=False,
+        help="print, as JSON to standard error, the time and memory used by each phase",
+    )
+    parser.add_argument(
+        "--stats-file",
+        metavar="STATS_FILE",
+        dest="stats_file",
+        action="store",
+        default=None,
+        help="append, as a line of JSON to STATS_FILE, the time and memory used by each phase",
+    )
     parser.add_argument(
         "--debug", dest="DEBUG", action="store_true", help="print diagnostic output"
     )
-    parser.add_argument("diff_filename", metavar="diff.txt", default=Path.cwd())
-    parser.add_argument("warning_filename", metavar="warnings.txt", nargs="?", default=None)
+    parser.add_argument(
+        "filenames",
+        metavar="diff.txt warnings.txt",
+        nargs="*",
+        help='a diff ("-" for standard input), then zero or more warnings files',
+    )
 
     args = parser.parse_args()
-    DEBUG = args.DEBUG
+
+    if args.git_diff is not None:
+        args.diff_filename = None
+        args.diff_name = f"git diff {args.git_diff}"
+        args.warning_filenames = args.filenames
+    elif args.filenames:
+        args.diff_filename = args.filenames[0]
+        args.diff_name = "stdin" if args.diff_filename == "-" else args.diff_filename
+        args.warning_filenames = args.filenames[1:]
+    else:
+        parser.error('the "diff.txt" argument is required unless --git-diff is provided')
+
+    if args.diff_filename == "-" and not args.warning_filenames:
+        eprint(PROGRAM, 'needs "warnings.txt" file argument when the diff is standard input')
+        sys.exit(2)
+
+    if args.diff_filename == "-" and args.index is not None and args.index_key is None:
+        eprint(PROGRAM, ": supply --index-key when --index is used with a diff on standard input")
+        sys.exit(2)
+
+    if (
+        args.git_diff is not None
+        and args.index is not None
+        and args.index_key is None
+        and ".." not in args.git_diff
+    ):
+        eprint(
+            PROGRAM,
+            ": supply --index-key, or a --git-diff range of the form A..B, when --index is used"
+            " with a diff against the working tree",
+        )
+        sys.exit(2)
 
     if args.guess_strip and args.strip_diff != 0:
         eprint(PROGRAM, ": don't supply both --guess-strip and --strip-diff")
@@ -420,150 +735,350 @@ def parse_args() -> argparse.Namespace:
         eprint(PROGRAM, ": don't supply both --guess-strip and --strip-warnings")
         sys.exit(2)
 
-    if args.guess_strip and args.warning_filename is None:
-        eprint(PROGRAM, 'needs "warnings.txt" file argument when --guess-strip is provided')
-        sys.exit(2)
-
-    if args.guess_strip:
-        guessed_strip = guess_strip_files(args.diff_filename, args.warning_filename)
-        if guessed_strip[0] == 1000:
-            if DEBUG:
-                eprint(
-                    "lint-diff.py: --guess-strip failed to guess values (maybe no files in common?)"
-                )
-        else:
-            args.strip_diff = guessed_strip[0]
-            args.strip_warnings = guessed_strip[1]
-            if DEBUG:
-                eprint(
-                    "lint-diff.py inferred "
-                    f"--strip-diff={args.strip_diff} --strip-warnings={args.strip_warnings}"
-                )
-
-    # A filename if the diff filenames start with "a/" and "b/", otherwise None.
-    # Is set by changed_lines().
-    args.relative_diff = None
+    # Measurements for --stats and --stats-file, or None if neither was supplied.
+    if args.print_stats or args.stats_file is not None:
+        args.stats = new_stats(args)
+    else:
+        args.stats = None
+    # Measurements of the current warnings file, or None; set by filter_warnings_file().
+    args.file_stats = None
 
     return args
 
 
-def changed_lines(args: argparse.Namespace) -> dict[str, set[int]]:
-    """Return a dictionary from file names to a set of ints (line numbers for changed lines).
-
-    Returns:
-        a dictionary from file names to a set of ints (line numbers for changed lines).
-    """
-    changed: dict[str, set[int]] = {}
-
-    with Path(args.diff_filename).open(encoding=encoding(args.diff_filename)) as diff:
-        atat_re = re.compile(r"@@ -([0-9]+)(,[0-9]+)? \+([0-9]+)(,[0-9]+)? @@.*")
-        # content_re = re.compile("[ +-].*")
-
-        filename = ""
-        lineno = -1000000
-        # Number of old-side and new-side lines remaining in the current hunk.
-        # While either is positive, the current line is a hunk body line (which
-        # starts with " ", "+", or "-") and must not be mistaken for a header
-        # such as "+++"/"---" -- an added line whose content starts with "++ "
-        # would otherwise look like a "+++ " file header.
-        remaining_old = 0
-        remaining_new = 0
-        for diff_line in diff:
-            if remaining_old <= 0 and remaining_new <= 0:
-                # Not inside a hunk body: look for headers.
-                if diff_line.startswith("---"):
-                    continue
-                match = PLUSPLUSPLUS_RE.match(diff_line)
-                if match:
-                    if match.group(1).startswith("b/"):  # heuristic
-                        args.relative_diff = diff_line
-                    try:
-                        filename = strip_dirs(match.group(1), args.strip_diff)
-                    except TypeError:
-                        filename = "diff filename above common directory"
-                        ## Not an error; it just means this file doesn't appear in warnings output.
-                        # eprint('Bad --strip-diff={0} ; line has fewer "/": {1}'.format(
-                        #   strip_diff, match.group(1)))
-                        # sys.exit(2)
-                    if filename not in changed:
-                        changed[filename] = set()
-                    continue
-                match = atat_re.match(diff_line)
-                if match:
-                    lineno = int(match.group(3))
-                    remaining_old = int(match.group(2)[1:]) if match.group(2) else 1
-                    remaining_new = int(match.group(4)[1:]) if match.group(4) else 1
-                    continue
-                continue
-            # Inside a hunk body.
-            if diff_line.startswith("+"):
-                # Not just the changed line: changed[filename].add(lineno)
-                for changed_lineno in range(
-                    lineno - args.context_lines, lineno + args.context_lines + 1
-                ):
-                    changed[filename].add(changed_lineno)
-                lineno += 1
-                remaining_new -= 1
-            elif diff_line.startswith("-"):
-                for changed_lineno in range(
-                    lineno - args.context_lines, lineno + args.context_lines
-                ):
-                    changed[filename].add(changed_lineno)
-                remaining_old -= 1
-            elif diff_line.startswith(" "):
-                lineno += 1
-                remaining_old -= 1
-                remaining_new -= 1
-            # Any other line (e.g., "\ No newline at end of file") is left as-is
-            # and does not consume a hunk line.
-
-    return changed
-
-
-def warn_relative_diff(args: argparse.Namespace) -> bool:
+def warn_relative_diff(args: argparse.Namespace, changed: ChangedLines, warnings: TextIO) -> bool:
     """Possibly warn about relative directories.
 
+    `warnings` is the open warnings file; if it is dumped, it is rewound afterward.
+
     Returns:
         a boolean.
     """
     result = False
-    if args.relative_diff is not None and args.strip_diff == 0:
+    if changed.relative_diff is not None and args.strip_diff == 0:
         # This is usually not an error, so don't warn.
-        if DEBUG:
+        if args.DEBUG:
             eprint(
                 "warning:",
-                args.diff_filename,
+                args.diff_name,
                 "may use relative paths (e.g.,",
-                args.relative_diff.strip(),
+                changed.relative_diff.strip(),
                 ") but --strip-diff=0",
                 ("(guessed)" if args.guess_strip else ""),
             )
             eprint("warning: (Maybe there were no files in common.)")
         result = True
-        if DEBUG:
-            eprint(f"lint-diff.py: diff file {args.diff_filename}:")
-            eprint(Path(args.diff_filename).read_text(encoding=encoding(args.diff_filename)))
+        if args.DEBUG:
+            eprint(f"lint-diff.py: diff file {args.diff_name}:")
+            if args.git_diff is None and args.diff_filename != "-":
+                with open_input(args.diff_filename) as diff:
+                    eprint("".join(input_lines(diff)))
             eprint(f"lint-diff.py: lint file {args.warning_filename}:")
-            eprint(
-                Path(args.warning_filename).read_text(encoding=encoding(args.warning_filename)),
-            )
+            if warnings.seekable():
+                eprint("".join(input_lines(warnings)))
+                warnings.seek(0)
             eprint("lint-diff.py: end of input files.")
 
     return result
 
 
-# As an alternative, could use the `chardet` package, but I don't want external dependencies.
-def encoding(file_path):
-    """Detect the encoding of a file.
+### Statistics
+
+# For --stats, each phase of the computation is measured by `measure_phase`.
+# Phases are:
+#  * load_index, save_index:  reading or writing the --index file
+#  * diff:  running `git diff` (for --git-diff), and reading and parsing the diff
+#  * guess_strip:  for each warnings file, --guess-strip
+#  * filter:  for each warnings file, reading it and outputting the relevant warnings
+
+
+def new_stats(args: argparse.Namespace) -> dict[str, Any]:
+    """Return an empty record of measurements, for --stats.
+
+    Returns:
+        a dictionary that `output_stats` will output as JSON.
+    """
+    return {
+        "program": PROGRAM,
+        "start_time": time.time(),
+        "start_perf_counter": time.perf_counter(),
+        "diff": args.diff_name,
+        "index_key": args.index_key,
+        "phases": {},
+        "warnings_files": [],
+    }
+
+
+@contextlib.contextmanager
+def measure_phase(
+    phases: dict[str, dict[str, Any]] | None, name: str
+) -> collections.abc.Generator[dict[str, Any]]:
+    """Measure the time taken by the body of a `with` statement, and record it in `phases`.
+
+    The body may record other measurements in the dictionary that this yields.
+    If `phases` is None, nothing is recorded.
+
+    Yields:
+        the measurements of the phase.
+    """
+    phase: dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        yield phase
+    finally:
+        if phases is not None:
+            phase["seconds"] = time.perf_counter() - start
+            phase["peak_rss_bytes"] = peak_rss_bytes()
+            phases[name] = phase
+
+
+def counted_lines(
+    lines: collections.abc.Iterable[str], phase: dict[str, Any], count_hunks: bool = False
+) -> collections.abc.Iterator[str]:
+    """Yield each of `lines`, recording in `phase` how many lines and bytes were read.
+
+    The bytes are those of the UTF-8 encoding of the lines.  If `count_hunks` is true,
+    also record the number of diff hunks.
+
+    Yields:
+        each of `lines`.
+    """
+    num_lines = 0
+    num_bytes = 0
+    num_hunks = 0
+    try:
+        for line in lines:
+            num_lines += 1
+            if line.isascii():
+                num_bytes += len(line)
+            else:
+                num_bytes += len(line.encode("utf-8", "surrogateescape"))
+            if count_hunks and line.startswith("@@"):
+                num_hunks += 1
+            yield line
+    finally:
+        phase["lines_read"] = num_lines
+        phase["bytes_read"] = num_bytes
+        if count_hunks:
+            phase["hunks"] = num_hunks
+
+
+def peak_rss_bytes(children: bool = False) -> int:
+    """Return the peak resident set size of this process (or of its terminated children).
+
+    Returns:
+        the peak resident set size in bytes, or 0 if it is not available.
+    """
+    try:
+        import resource  # ruff:ignore[import-outside-top-level]
+    except ImportError:
+        # The `resource` module is not available on Windows.
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere.
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def changed_lines_stats(changed: ChangedLines) -> dict[str, int]:
+    """Return the size of the changed lines of a diff.
+
+    Returns:
+        the number of files, intervals, and changed lines, and the bytes used by the intervals.
+    """
+    num_intervals = 0
+    num_lines = 0
+    num_bytes = 0
+    for ranges in changed.files.values():
+        num_intervals += len(ranges)
+        num_lines += sum(ranges.ends) - sum(ranges.starts) + len(ranges)
+        num_bytes += ranges.starts.itemsize * len(ranges.starts) * 2
+    return {
+        "files": len(changed.files),
+        "intervals": num_intervals,
+        "lines": num_lines,
+        "bytes": num_bytes,
+    }
+
+
+def output_stats(args: argparse.Namespace) -> None:
+    """Output `args.stats` as a line of JSON, to standard error and/or to `args.stats_file`."""
+    stats = args.stats
+    stats["seconds"] = time.perf_counter() - stats.pop("start_perf_counter")
+    stats["peak_rss_bytes"] = peak_rss_bytes()
+    line = json.dumps(stats)
+    if args.print_stats:
+        eprint(line)
+    if args.stats_file is not None:
+        # A single write, so that concurrent runs do not interleave their lines.
+        with Path(args.stats_file).open("a") as stats_file:
+            stats_file.write(line + "\n")
+
+
+### Index
+
+# An index file holds the changed lines of a diff, so that it need not be recomputed by
+# later runs (say, by later steps of a CI job that use the same diff).  Its format is:
+#  * a line containing INDEX_MAGIC
+#  * a line containing a JSON object with the index key, the byte order, the
+#    `relative_diff` of the `ChangedLines`, and a list of [filename, number of
+#    intervals] pairs
+#  * the start line numbers of all the intervals, as 8-byte integers, file by file
+#  * the end line numbers of all the intervals, in the same order
+# Filenames are stored as they appear in the diff, so the index remains valid for any
+# --strip-diff or --guess-strip value; it is invalid if the diff or --context differs.
+
+INDEX_MAGIC = b"lint-diff.py index, version 1"
+
+
+def index_key(args: argparse.Namespace) -> dict[str, Any]:
+    """Return what an index file must record in order to be used for these arguments.
+
+    Returns:
+        what an index file must record in order to be used for these arguments.
+    """
+    if args.index_key is not None:
+        diff_key = args.index_key
+    elif args.git_diff is not None:
+        diff_key = run_git(["rev-parse", args.git_diff])
+    else:
+        diff_path = Path(args.diff_filename).resolve()
+        diff_stat = diff_path.stat()
+        diff_key = f"{diff_path} {diff_stat.st_size} {diff_stat.st_mtime_ns}"
+    return {"diff": diff_key, "context": args.context_lines}
+
+
+def save_index(
+    index_filename: str,
+    key: dict[str, Any],
+    changed: ChangedLines,
+) -> None:
+    """Write the changed lines of a diff to an index file."""
+    header = {
+        "key": key,
+        "byteorder": sys.byteorder,
+        "relative_diff": changed.relative_diff,
+        "files": [[filename, len(ranges)] for filename, ranges in changed.files.items()],
+    }
+    starts = array("q")
+    ends = array("q")
+    for ranges in changed.files.values():
+        starts.extend(ranges.starts)
+        ends.extend(ranges.ends)
+    index_path = Path(index_filename)
+    # Write to a temporary file and rename it, so a concurrent reader never sees a partial index.
+    temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with temp_path.open("wb") as index_file:
+        index_file.write(INDEX_MAGIC + b"\n")
+        index_file.write(json.dumps(header).encode("utf-8", "surrogateescape") + b"\n")
+        starts.tofile(index_file)
+        ends.tofile(index_file)
+    temp_path.replace(index_path)
+
+
+def load_index(index_filename: str, key: dict[str, Any]) -> ChangedLines | None:
+    """Read an index file written by `save_index`.
 
     Returns:
-        "utf-8" if the file is encoded using UTF-8, "iso-8859-1" otherwise.
+        the changed lines that are stored in the index file, or None if the
+        file does not exist, is for a different key, or is malformed (say, truncated).
     """
     try:
-        Path(file_path).read_bytes().decode("utf-8")
-        return "utf-8"
-    except UnicodeDecodeError:
-        return "iso-8859-1"
+        contents = Path(index_filename).read_bytes()
+    except FileNotFoundError:
+        return None
+    parts = contents.split(b"\n", 2)
+    if len(parts) != 3 or parts[0] != INDEX_MAGIC:
+        return None
+    header_bytes, data = parts[1], parts[2]
+    try:
+        header = json.loads(header_bytes.decode("utf-8", "surrogateescape"))
+        if header["key"] != key or header["byteorder"] not in ("little", "big"):
+            return None
+        lengths = [length for _, length in header["files"]]
+        relative_diff = header["relative_diff"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not all(isinstance(length, int) and length >= 0 for length in lengths):
+        return None
+    # Each interval has an 8-byte start and an 8-byte end.
+    if len(data) != 16 * sum(lengths):
+        return None
+    bounds = array("q")
+    bounds.frombytes(data)
+    if header["byteorder"] != sys.byteorder:
+        bounds.byteswap()
+    # The start line numbers are the first half of `bounds`; the end line numbers are the rest.
+    num_intervals = len(bounds) // 2
+    changed = {}
+    offset = 0
+    for filename, length in header["files"]:
+        changed[filename] = LineRanges.from_arrays(
+            bounds[offset : offset + length],
+            bounds[num_intervals + offset : num_intervals + offset + length],
+        )
+        offset += length
+    return ChangedLines(changed, relative_diff)
+
+
+### Input
+
+
+def diff_lines(args: argparse.Namespace) -> collections.abc.Iterator[str]:
+    """Yield the lines of the diff:  from git, from standard input, or from a file.
+
+    Yields:
+        the lines of the diff.
+    """
+    if args.git_diff is not None:
+        yield from git_diff_lines(args.git_diff)
+    elif args.diff_filename == "-":
+        yield from input_lines(open_stdin())
+    else:
+        with open_input(args.diff_filename) as diff:
+            yield from input_lines(diff)
+
+
+def git_diff_lines(commit_range: str) -> collections.abc.Iterator[str]:
+    """Yield the lines of `git diff commit_range`, as git produces them.
+
+    The diff has no context lines, which `changed_lines` does not need.  Its "a/" and "b/"
+    prefixes are given explicitly, so that --strip-diff does not depend on the user's git
+    configuration (such as diff.noprefix).  No temporary file is written.
+
+    Yields:
+        the lines of the diff.
+    """
+    command = ["git", "--no-pager", "diff", "--no-color", "--no-ext-diff", "--unified=0"]
+    command += ["--src-prefix=a/", "--dst-prefix=b/", commit_range]
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as git_process:
+        yield from input_lines(
+            io.TextIOWrapper(git_process.stdout, encoding="utf-8", errors="surrogateescape")
+        )
+    if git_process.returncode != 0:
+        eprint(PROGRAM, ": command failed with status", git_process.returncode, ":", *command)
+        sys.exit(2)
+
+
+def run_git(arguments: list[str]) -> str:
+    """Run git with the given arguments, and return its output.
+
+    Returns:
+        the standard output of git.
+    """
+    git_result = subprocess.run(["git", *arguments], capture_output=True, check=False)
+    if git_result.returncode != 0:
+        eprint(PROGRAM, ": git", *arguments, "failed:", git_result.stderr.decode(errors="replace"))
+        sys.exit(2)
+    return git_result.stdout.decode(errors="surrogateescape")
+
+
+def open_stdin() -> TextIO:
+    """Return standard input, decoded in the same way as by `open_input`.
+
+    Returns:
+        standard input, decoded in the same way as by `open_input`.
+    """
+    return decode_input(sys.stdin.buffer)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1063 @@
+"""Filter warnings output, to only show output for changed lines.
+
+This module is the library that `lint-diff.py` is built on; see the
+documentation at the top of that file.  It can be imported, to filter warnings
+within a Python program rather than by running `lint-diff.py`:
+
+    import lint_diff
+
+    changed = lint_diff.ChangedLines.from_path("changes.diff")
+    for line in lint_diff.filter_warnings(warning_lines, changed, guess_strip=True):
+        print(line, end="")
+
+A `ChangedLines` can be reused to filter any number of warnings.  This module
+has no global state, and it does not import modules that it does not need
+for the common case, so that importing it is fast.
+"""
+
+import collections.abc
+import io
+import itertools
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from typing import TYPE_CHECKING, BinaryIO, TextIO
+
+if TYPE_CHECKING:
+    import tempfile
+
+PLUSPLUSPLUS_RE = re.compile(r"\+\+\+ (\S*).*")
+
+# This cannot be multiline because files are read one line at a time.
+FILENAME_LINENO_RE = re.compile(r"([^:]*):([0-9]+):.*")
+
+INITIAL_WHITESPACE_RE = re.compile(r"[ \t]")
+
+# How many characters `guess_strip_stream` keeps in memory before spooling to a temporary file.
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+
+# Matches a byte that was not valid UTF-8, as decoded by the "surrogateescape" error handler.
+SURROGATE_RE = re.compile(r"[\udc80-\udcff]")
+
+
+### Changed lines
+
+
+class ChangedLines:
+    """The line numbers of the lines that a diff changed, for each file in the diff.
+
+    The file names are as they appear in the diff, unless `strip` has been called.
+    """
+
+    __slots__ = ("files", "relative_diff")
+
+    def __init__(
+        self, files: dict[str, "LineRanges"] | None = None, relative_diff: str | None = None
+    ) -> None:
+        """Create a ChangedLines from the result of `changed_lines`."""
+        # Maps each file name to the line numbers of its changed lines.
+        self.files: dict[str, LineRanges] = {} if files is None else files
+        # A "+++" line of the diff if its filenames start with "a/" and "b/", otherwise None.
+        self.relative_diff = relative_diff
+
+    @classmethod
+    def from_lines(
+        cls, diff: collections.abc.Iterable[str], context_lines: int = 2
+    ) -> "ChangedLines":
+        """Read a diff, such as an open text file.
+
+        `context_lines` is how many lines around each changed one are also considered changed.
+
+        Returns:
+            the changed lines of the diff.
+        """
+        return cls(*changed_lines(diff, context_lines))
+
+    @classmethod
+    def from_path(cls, diff_path: str | os.PathLike[str], context_lines: int = 2) -> "ChangedLines":
+        """Read a diff from a file, as by `from_lines`.
+
+        Returns:
+            the changed lines of the diff.
+        """
+        with open_input(diff_path) as diff:
+            return cls.from_lines(input_lines(diff), context_lines)
+
+    @classmethod
+    def from_bytes(cls, diff: bytes, context_lines: int = 2) -> "ChangedLines":
+        """Read a diff, such as the output of `git diff`, as by `from_lines`.
+
+        The diff may be compressed, as for `decompress`.
+
+        Returns:
+            the changed lines of the diff.
+        """
+        compression = compression_format(diff[:6])
+        if compression is not None:
+            with open_decompressor(compression, io.BytesIO(diff)) as decompressed:
+                return cls.from_lines((decode_line(line) for line in decompressed), context_lines)
+        return cls.from_lines(
+            (decode_line(line) for line in diff.splitlines(keepends=True)), context_lines
+        )
+
+    def strip(self, num_dirs: int) -> "ChangedLines":
+        """Strip off `num_dirs` leading "/" characters from each file name.
+
+        Returns:
+            the same changed lines, for the stripped file names.
+        """
+        return ChangedLines(strip_changed_lines(self.files, num_dirs), self.relative_diff)
+
+    def filenames(self) -> set[str]:
+        """All the filenames in the diff.
+
+        Returns:
+            All the filenames in the diff.
+        """
+        return diff_filenames(self.files)
+
+    def is_changed(self, filename: str, lineno: int) -> bool:
+        """Return true if the given line of the given file was changed.
+
+        Returns:
+            true if the given line of the given file was changed.
+        """
+        ranges = self.files.get(filename)
+        return ranges is not None and lineno in ranges
+
+
+class LineRanges:
+    """A set of line numbers, represented as sorted, disjoint closed intervals.
+
+    Memory use is proportional to the number of intervals (roughly, the number
+    of hunks in a diff), not to the number of lines that the intervals cover.
+    """
+
+    __slots__ = ("ends", "starts")
+
+    def __init__(self, intervals: collections.abc.Iterable[tuple[int, int]] = ()) -> None:
+        """Create a LineRanges from closed intervals, which may overlap and be in any order."""
+        self.starts = array("q")
+        self.ends = array("q")
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1] + 1:
+                # Overlapping or adjacent:  extend the previous interval.
+                self.ends[-1] = max(end, self.ends[-1])
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def from_arrays(cls, starts: array, ends: array) -> "LineRanges":
+        """Create a LineRanges from arrays that are already sorted, disjoint, and coalesced.
+
+        Returns:
+            a LineRanges that uses the given arrays.
+        """
+        result = cls()
+        result.starts = starts
+        result.ends = ends
+        return result
+
+    def __contains__(self, lineno: object) -> bool:
+        """Return true if `lineno` is in one of the intervals.
+
+        Returns:
+            true if `lineno` is in one of the intervals.
+        """
+        if not isinstance(lineno, int):
+            return False
+        index = bisect_right(self.starts, lineno) - 1
+        return index >= 0 and lineno <= self.ends[index]
+
+    def interval(self, lineno: int) -> tuple[int, int] | None:
+        """Return the interval that contains `lineno`, or None if there is none.
+
+        Returns:
+            the interval that contains `lineno`, as a pair of its first and last line numbers.
+        """
+        index = bisect_right(self.starts, lineno) - 1
+        if index >= 0 and lineno <= self.ends[index]:
+            return (self.starts[index], self.ends[index])
+        return None
+
+    def __len__(self) -> int:
+        """Return the number of intervals.
+
+        Returns:
+            the number of intervals.
+        """
+        return len(self.starts)
+
+    def __iter__(self) -> collections.abc.Iterator[tuple[int, int]]:
+        """Yield each interval, as a pair of its first and last line numbers.
+
+        Yields:
+            each interval, as a pair of its first and last line numbers.
+        """
+        yield from zip(self.starts, self.ends, strict=True)
+
+    def __repr__(self) -> str:
+        """Return the intervals, as a list of pairs.
+
+        Returns:
+            the intervals, as a list of pairs.
+        """
+        return str([list(interval) for interval in self])
+
+
+## Tests:
+"""
+ranges = LineRanges([(10, 12), (1, 3), (4, 4), (11, 20), (30, 29)])
+assert list(ranges) == [(1, 4), (10, 20)]
+assert 0 not in ranges and 1 in ranges and 4 in ranges and 5 not in ranges
+assert 9 not in ranges and 10 in ranges and 20 in ranges and 21 not in ranges
+assert ranges.interval(12) == (10, 20) and ranges.interval(5) is None
+"""
+
+
+def add_interval(intervals: list[tuple[int, int]], start: int, end: int) -> None:
+    """Add the closed interval [start, end] to `intervals`, unless it is empty.
+
+    If the new interval overlaps or abuts the last one in the list, they are
+    coalesced, which keeps the list short for runs of consecutive changed lines.
+    """
+    if start > end:
+        return
+    if intervals:
+        last_start, last_end = intervals[-1]
+        if last_start <= start <= last_end + 1:
+            if end > last_end:
+                intervals[-1] = (last_start, end)
+            return
+    intervals.append((start, end))
+
+
+def changed_lines(
+    diff: collections.abc.Iterable[str], context_lines: int
+) -> tuple[dict[str, LineRanges], str | None]:
+    """Return a dictionary from file names to the line numbers of changed lines.
+
+    The file names are exactly as they appear in the diff; see `strip_changed_lines`.
+    `context_lines` is how many lines around each changed one are also considered changed.
+
+    Returns:
+        a dictionary from file names to the line numbers of changed lines, and
+        a "+++" line of the diff if its filenames start with "a/" and "b/" (otherwise None).
+    """
+    # Maps each file name to a list of closed intervals of changed line numbers.
+    intervals: dict[str, list[tuple[int, int]]] = {}
+    relative_diff = None
+
+    atat_re = re.compile(r"@@ -([0-9]+)(,[0-9]+)? \+([0-9]+)(,[0-9]+)? @@.*")
+    # content_re = re.compile("[ +-].*")
+
+    filename = ""
+    file_intervals: list[tuple[int, int]] = []
+    lineno = -1000000
+    # Number of old-side and new-side lines remaining in the current hunk.
+    # While either is positive, the current line is a hunk body line (which
+    # starts with " ", "+", or "-") and must not be mistaken for a header
+    # such as "+++"/"---" -- an added line whose content starts with "++ "
+    # would otherwise look like a "+++ " file header.
+    remaining_old = 0
+    remaining_new = 0
+    for diff_line in diff:
+        if remaining_old <= 0 and remaining_new <= 0:
+            # Not inside a hunk body: look for headers.
+            if diff_line.startswith("---"):
+                continue
+            match = PLUSPLUSPLUS_RE.match(diff_line)
+            if match:
+                if match.group(1).startswith("b/"):  # heuristic
+                    relative_diff = diff_line
+                filename = match.group(1)
+                file_intervals = intervals.setdefault(filename, [])
+                continue
+            match = atat_re.match(diff_line)
+            if match:
+                lineno = int(match.group(3))
+                remaining_old = int(match.group(2)[1:]) if match.group(2) else 1
+                remaining_new = int(match.group(4)[1:]) if match.group(4) else 1
+                if remaining_new == 0:
+                    # The hunk only removes lines.  Its new-side line number is that of the line
+                    # before the removal, which matters when there are no context lines, as for
+                    # `git diff --unified=0`.  Make it the line after, as if there were context.
+                    lineno += 1
+                continue
+            continue
+        # Inside a hunk body.
+        if diff_line.startswith("+"):
+            # Not just the changed line, but also the context around it.
+            add_interval(file_intervals, lineno - context_lines, lineno + context_lines)
+            lineno += 1
+            remaining_new -= 1
+        elif diff_line.startswith("-"):
+            add_interval(file_intervals, lineno - context_lines, lineno + context_lines - 1)
+            remaining_old -= 1
+        elif diff_line.startswith(" "):
+            lineno += 1
+            remaining_old -= 1
+            remaining_new -= 1
+        # Any other line (e.g., "\ No newline at end of file") is left as-is
+        # and does not consume a hunk line.
+
+    changed = {
+        filename: LineRanges(file_intervals) for filename, file_intervals in intervals.items()
+    }
+    return changed, relative_diff
+
+
+def strip_changed_lines(changed: dict[str, LineRanges], num_dirs: int) -> dict[str, LineRanges]:
+    """Strip off `num_dirs` leading "/" characters from each file name in `changed`.
+
+    Returns:
+        a dictionary like `changed`, but whose keys have been passed through `strip_dirs`.
+    """
+    if num_dirs == 0:
+        return changed
+    intervals: dict[str, list[tuple[int, int]]] = {}
+    for filename, ranges in changed.items():
+        try:
+            stripped = strip_dirs(filename, num_dirs)
+        except TypeError:
+            stripped = "diff filename above common directory"
+            ## Not an error; it just means this file doesn't appear in warnings output.
+            # eprint('Bad --strip-diff={0} ; line has fewer "/": {1}'.format(
+            #   strip_diff, filename))
+            # sys.exit(2)
+        # Distinct diff file names may be equal after stripping.
+        intervals.setdefault(stripped, []).extend(ranges)
+    return {filename: LineRanges(file_intervals) for filename, file_intervals in intervals.items()}
+
+
+def strip_dirs(filename: str, num_dirs: int) -> str:
+    """Strip off `num_dirs` leading "/" characters.
+
+    Returns:
+        A subdirectory, with `num_dirs` top-level enclosing directories removed.
+    """
+    if num_dirs == 0:
+        return filename
+    return os.path.join(*(filename.split(os.path.sep)[num_dirs:]))  # ruff:ignore[os-path-join]
+
+
+## Tests:
+"""
+import os
+assert strip_dirs("/a/b/c/d", 0) == '/a/b/c/d'
+assert strip_dirs("/a/b/c/d", 1) == 'a/b/c/d'
+assert strip_dirs("/a/b/c/d", 2) == 'b/c/d'
+assert strip_dirs("/a/b/c/d", 3) == 'c/d'
+assert strip_dirs("/a/b/c/d", 4) == 'd'
+assert strip_dirs("/a/b/c/", 0) == '/a/b/c/'
+assert strip_dirs("/a/b/c/", 1) == 'a/b/c/'
+assert strip_dirs("/a/b/c/", 2) == 'b/c/'
+assert strip_dirs("/a/b/c/", 3) == 'c/'
+assert strip_dirs("/a/b/c/", 4) == ''
+"""
+
+
+def min_strips(filename1: str, filename2: str) -> tuple[int, int, str, str]:
+    """Find matching suffixes of the given filenames.
+
+    Returns a 4-tuple of 2 integers and 2 strings.  The integers
+    indicate the smallest strip values that make the two filenames equal,
+    or a maximal pair if the files have different basenames.  The last two
+    elements of the tuple are the argument strings.
+
+    Returns:
+        A 4-tuple of 2 integers and 2 strings.
+    """
+    components1 = filename1.split(os.path.sep)
+    components2 = filename2.split(os.path.sep)
+    if components1[-1] != components2[-1]:
+        ## TODO: is this special case necessary?
+        return (1000, 1000, filename1, filename2)
+    while components1 and components2 and components1[-1] == components2[-1]:
+        del components1[-1]
+        del components2[-1]
+    return (len(components1), len(components2), filename1, filename2)
+
+
+## Tests:
+"""
+import os
+assert min_strips("/a/b/c/d", "/a/b/c/d") == (0, 0, "/a/b/c/d", "/a/b/c/d")
+assert min_strips("e1/e2/a/b/c/d", "/a/b/c/d") == (2, 1, "e1/e2/a/b/c/d", "/a/b/c/d")
+assert min_strips("/e1/e2/a/b/c/d", "/a/b/c/d") == (3, 1, "/e1/e2/a/b/c/d", "/a/b/c/d")
+assert min_strips("e1/e2/a/b/c/d", "a/b/c/d") == (2, 0, "e1/e2/a/b/c/d", "a/b/c/d")
+assert min_strips("/e1/e2/a/b/c/d", "a/b/c/d") == (3, 0, "/e1/e2/a/b/c/d", "a/b/c/d")
+assert min_strips("/a/b/c/d", "/e/f/g/h") == (1000, 1000, "/a/b/c/d", "/e/f/g/h")
+"""
+
+
+def pair_min(
+    pair1: tuple[int, int, str, str], pair2: tuple[int, int, str, str]
+) -> tuple[int, int, str, str]:
+    """Given two tuples, returns the one that is pointwise lesser in its first two elements.
+
+    Fails if neither is lesser.
+
+    Returns:
+        the argument that is pointwise lesser in its first two elements.
+    """
+    if pair1[0] <= pair2[0] and pair1[1] <= pair2[1]:
+        return pair1
+    if pair1[0] >= pair2[0] and pair1[1] >= pair2[1]:
+        return pair2
+    msg = f"incomparable pairs: {pair1} {pair2}"
+    raise Exception(msg)
+
+
+## Tests:
+"""
+import os
+assert pair_min((3,4,"a","b"), (5,6,"c","d")) == (3,4,"a","b")
+assert pair_min((4,3,"a","b"), (6,5,"c","d")) == (4,3,"a","b")
+assert pair_min((30,40,"a","b"), (5,6,"c","d")) == (5,6,"c","d")
+assert pair_min((40,30,"a","b"), (6,5,"c","d")) == (6,5,"c","d")
+"""
+
+
+def diff_filenames(changed: dict[str, LineRanges]) -> set[str]:
+    """All the filenames in a diff, given the result of `changed_lines` for it.
+
+    Returns:
+        All the filenames in the diff.
+    """
+    return {filename for filename in changed if filename != "/dev/null"}
+
+
+def warning_filenames(warning_lines: collections.abc.Iterable[str]) -> set[str]:
+    """All the filenames in the given warning lines.
+
+    Returns:
+        All the filenames in the given warning lines.
+    """
+    result = set()
+    for warning_line in warning_lines:
+        match = FILENAME_LINENO_RE.match(warning_line)
+        if match:
+            # lstrip is necessary because after Gradle outputs all warnings,
+            # it prints "> Compilation failed; see the compiler output
+            # below." and then prints one warning, indented by two spaces.
+            result.add(match.group(1).lstrip())
+    return result
+
+
+def guess_strip_filenames(
+    diff_filenames: set[str], warning_filenames: set[str]
+) -> tuple[int, int, str, str]:
+    """Match subdirectory structure.
+
+    Arguments are two lists of file names.
+
+    Returns:
+        A 4-tuple of 2 integers and 2 strings, as for `min_strips`.
+    """
+    guesser = StripGuesser(diff_filenames)
+    for warning_filename in warning_filenames:
+        guesser.add_warning_filename(warning_filename)
+    return guesser.result()
+
+
+class SuffixTrieNode:
+    """A node in a trie of reversed path components, used by `StripGuesser`."""
+
+    __slots__ = ("children", "filename", "min_components")
+
+    def __init__(self) -> None:
+        """Create a trie node with no children."""
+        # Maps a path component to the child node for filenames with that next-to-last component.
+        self.children: dict[str, SuffixTrieNode] = {}
+        # The fewest path components of any filename at or below this node.
+        self.min_components = 1000000
+        # A filename at or below this node that has `min_components` path components.
+        self.filename = ""
+
+
+class StripGuesser:
+    """Guesses values for --strip-diff and --strip-warnings.
+
+    The result is that of applying `pair_min` to `min_strips` of every pair of
+    a diff filename and a warning filename, except that it is deterministic
+    about when to raise "incomparable pairs":  exactly when no pair is
+    pointwise least.  Rather than trying all pairs, it walks each warning
+    filename's path components, last first, down a trie of the diff
+    filenames, so the time is linear in the total length of the filenames.
+    """
+
+    def __init__(self, diff_filenames: collections.abc.Iterable[str]) -> None:
+        """Create a StripGuesser for the given diff filenames."""
+        self.root = SuffixTrieNode()
+        for diff_filename in diff_filenames:
+            components = diff_filename.split(os.path.sep)
+            node = self.root
+            for component in reversed(components):
+                node = node.children.setdefault(component, SuffixTrieNode())
+                if len(components) < node.min_components:
+                    node.min_components = len(components)
+                    node.filename = diff_filename
+        # The candidate pairs that no other candidate is pointwise less than or equal to.
+        self.minimal: list[tuple[int, int, str, str]] = []
+
+    def add_warning_filename(self, warning_filename: str) -> None:
+        """Consider every pair of the given warning filename with a diff filename."""
+        components = warning_filename.split(os.path.sep)
+        node = self.root
+        for depth, component in enumerate(reversed(components), start=1):
+            child = node.children.get(component)
+            if child is None:
+                return
+            node = child
+            # The diff filenames at or below `node` share at least `depth` trailing path
+            # components with `warning_filename`.  If one shares more, its pair is pointwise
+            # lesser than this one, so this one can only overestimate a non-minimal pair.
+            self.add_candidate(
+                (
+                    node.min_components - depth,
+                    len(components) - depth,
+                    node.filename,
+                    warning_filename,
+                )
+            )
+
+    def add_candidate(self, candidate: tuple[int, int, str, str]) -> None:
+        """Add a pair of strip values to the candidates, unless a lesser one is present."""
+        if any(old[0] <= candidate[0] and old[1] <= candidate[1] for old in self.minimal):
+            return
+        self.minimal = [
+            old for old in self.minimal if not (candidate[0] <= old[0] and candidate[1] <= old[1])
+        ]
+        self.minimal.append(candidate)
+
+    def result(self) -> tuple[int, int, str, str]:
+        """Return the pointwise least pair seen so far.
+
+        Fails if there are incomparable pairs but no pointwise least one.
+
+        Returns:
+            A 4-tuple of 2 integers and 2 strings, as for `min_strips`.
+        """
+        if not self.minimal:
+            return (1000, 1000, "no files seen yet", "no files seen yet")
+        if len(self.minimal) > 1:
+            # Raises an "incomparable pairs" exception.
+            pair_min(self.minimal[0], self.minimal[1])
+        return self.minimal[0]
+
+    def copy(self) -> "StripGuesser":
+        """Return a StripGuesser for the same diff filenames, that has seen no warning filenames.
+
+        The copy shares this one's trie, so one trie can be used for many warnings files.
+
+        Returns:
+            a StripGuesser for the same diff filenames.
+        """
+        result = StripGuesser(())
+        result.root = self.root
+        return result
+
+
+def guess_strip_files(
+    diff_files: set[str], warnings: TextIO, debug: bool = False
+) -> tuple[int, int, str, str]:
+    """Match subdirectory structure.
+
+    Arguments are the filenames in a diff, and a file produced by a lint tool.
+    The lint file is read, then rewound so that it can be filtered.  If `debug` is
+    true, print diagnostic output.
+
+    Returns:
+        A 4-tuple of 2 integers and 2 strings, as for `min_strips`.
+    """
+    warning_files = warning_filenames(input_lines(warnings))
+    warnings.seek(0)
+    result = guess_strip_filenames(diff_files, warning_files)
+    diff_prefix = commonpath(diff_files)
+    try:
+        warnings_prefix = commonpath(warning_files)
+    except ValueError:
+        for line in input_lines(warnings):
+            # rstrip is necessary because print adds a newline.
+            print(line.rstrip(), file=sys.stderr)
+        raise
+    if result[0] > diff_prefix.count("/") or result[1] > warnings_prefix.count("/"):
+        # This is not necessarily a problem.  It is possible that all the
+        # diffs, or all the lint output, happens to be in one subdirectory.
+        if debug:
+            print(
+                "lint-diff.py: guess_strip_files all in one subdirectory: "
+                f"result={result} diff_prefix={diff_prefix} warnings_prefix={warnings_prefix}",
+                file=sys.stderr,
+            )
+            print(f"diff_files={diff_files}", file=sys.stderr)
+            print(f"warning_files={warning_files}", file=sys.stderr)
+    return result
+
+
+def guess_strip_stream(
+    diff_files: set[str], warning_lines: collections.abc.Iterator[str], window: int
+) -> tuple[tuple[int, int, str, str], collections.abc.Iterator[str]]:
+    """Match subdirectory structure, reading the warnings only once.
+
+    Reads warning lines until `window` distinct filenames have been seen (or
+    the warnings end), and guesses strip values from those filenames.  The
+    lines that were read are saved in a spool, which is kept in memory if it
+    is small and otherwise is written to a temporary file.
+
+    Returns:
+        A 4-tuple of 2 integers and 2 strings, as for `min_strips`, and an
+        iterator over all the warning lines:  the spooled ones, then the rest.
+    """
+    import tempfile  # ruff:ignore[import-outside-top-level]
+
+    guesser = StripGuesser(diff_files)
+    seen_filenames = set()
+    # pylint: disable=consider-using-with
+    spool = tempfile.SpooledTemporaryFile(  # ruff:ignore[open-file-with-context-handler]
+        max_size=SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8", newline=""
+    )
+    for warning_line in warning_lines:
+        spool.write(warning_line)
+        match = FILENAME_LINENO_RE.match(warning_line)
+        if match:
+            # lstrip is necessary for the same reason as in `warning_filenames`.
+            filename = match.group(1).lstrip()
+            if filename not in seen_filenames:
+                seen_filenames.add(filename)
+                guesser.add_warning_filename(filename)
+                if len(seen_filenames) >= window:
+                    break
+    spool.seek(0)
+    return guesser.result(), itertools.chain(read_spool(spool), warning_lines)
+
+
+def read_spool(spool: "tempfile.SpooledTemporaryFile") -> collections.abc.Iterator[str]:
+    """Yield the lines of a spool, then close it.
+
+    Yields:
+        the lines of the spool.
+    """
+    with spool:
+        yield from spool
+
+
+def commonpath(files: collections.abc.Iterable[str]) -> str:
+    """Return the common prefix of the given paths.
+
+    Argument is a set or list of paths.
+
+    Returns:
+         the common prefix of the given paths.
+    """
+    if not files:
+        return ""
+    try:
+        # Remove leading null characters.
+        files_list = [file.lstrip("\0") for file in files]
+        return os.path.commonpath(files_list)
+    except ValueError as err:
+        raise ValueError(str(files)) from err
+
+
+### Filtering
+
+
+class WarningFilter:
+    """Selects the lines of warnings output that are about changed lines.
+
+    A warning starts with "FILENAME:LINENO:".  Lines that start with whitespace
+    continue the preceding warning and are selected if it is.  A Java exception
+    ("Exception in thread ...") is always selected.  `filter` may be called on
+    successive parts of the same warnings output.
+    """
+
+    __slots__ = (
+        "absolute_filename",
+        "changed",
+        "check_absolute_paths",
+        "continuing",
+        "num_selected",
+        "strip_warnings",
+    )
+
+    def __init__(
+        self, changed: ChangedLines, strip_warnings: int = 0, check_absolute_paths: bool = True
+    ) -> None:
+        """Create a WarningFilter.
+
+        `changed` should already be stripped, by `ChangedLines.strip`.  `strip_warnings`
+        is how many leading "/" to ignore in filenames in the warnings.  If
+        `check_absolute_paths` is true, `absolute_filename` is set as described below.
+        """
+        self.changed = changed
+        self.strip_warnings = strip_warnings
+        self.check_absolute_paths = (
+            check_absolute_paths and changed.relative_diff is not None and strip_warnings == 0
+        )
+        # The first absolute filename in a warning, when the diff uses relative filenames
+        # and `strip_warnings` is 0.  Such a warning can never be selected, which usually
+        # means that the strip values are wrong.  None if there is no such warning.
+        self.absolute_filename: str | None = None
+        # True if the last line read was selected, so continuation lines are selected too.
+        self.continuing = False
+        # The number of lines selected so far.
+        self.num_selected = 0
+
+    def filter(self, warning_lines: collections.abc.Iterable[str]) -> collections.abc.Iterator[str]:
+        """Yield each of the warning lines that is about a changed line.
+
+        Yields:
+            each of the warning lines that is about a changed line.
+        """
+        for warning_line, _ in self.select(warning_lines):
+            if warning_line is not None:
+                yield warning_line
+
+    def records(
+        self, warning_lines: collections.abc.Iterable[str]
+    ) -> collections.abc.Iterator["WarningRecord"]:
+        """Yield each warning that is about a changed line, with its continuation lines.
+
+        Each warning is yielded as soon as the line after its last continuation line
+        is read, so that it can be output while the rest of the warnings are read.
+
+        Yields:
+            each warning that is about a changed line.
+        """
+        changed = self.changed.files
+        record = None
+        for warning_line, location in self.select(warning_lines):
+            if warning_line is None:
+                if record is not None:
+                    yield record
+                    record = None
+            elif location is None:
+                if record is not None:
+                    record.lines.append(warning_line)
+            else:
+                if record is not None:
+                    yield record
+                filename, lineno = location
+                file_ranges = changed.get(filename) if filename is not None else None
+                hunk = file_ranges.interval(lineno) if file_ranges and lineno is not None else None
+                record = WarningRecord(filename, lineno, hunk, [warning_line])
+        if record is not None:
+            yield record
+
+    def select(
+        self, warning_lines: collections.abc.Iterable[str]
+    ) -> collections.abc.Iterator[tuple[str | None, tuple[str | None, int | None] | None]]:
+        """Yield each of the warning lines that is about a changed line, with its location.
+
+        The location of a line that starts a warning is its filename (with
+        `strip_warnings` leading directories stripped) and its line number, or
+        (None, None) for a Java exception that has neither.  The location of a
+        continuation line is None.  After the last continuation line of a warning,
+        (None, None) is yielded instead of a line, when the next line is read.
+
+        Yields:
+            pairs of a warning line and its location.
+        """
+        changed = self.changed.files
+        strip_warnings = self.strip_warnings
+        check_absolute_paths = self.check_absolute_paths and self.absolute_filename is None
+        continuing = self.continuing
+        # Usually, few of the files in the warnings are in the diff.  A line whose
+        # filename's last component is not that of any file in the diff can be
+        # rejected without a regular expression match or `strip_dirs`, because
+        # stripping leading directories does not change the last component.
+        changed_basenames = {filename.rpartition(os.path.sep)[2] for filename in changed}
+        # Lines that start with one of these must not be rejected early:  they may be
+        # selected even if their file is not in the diff, or may have an absolute filename.
+        if check_absolute_paths:
+            not_prefiltered: tuple[str, ...] = ("Exception in thread", "/")
+        else:
+            not_prefiltered = ("Exception in thread",)
+
+        try:
+            for warning_line in warning_lines:
+                if continuing:
+                    if INITIAL_WHITESPACE_RE.match(warning_line):
+                        self.num_selected += 1
+                        yield warning_line, None
+                        continue
+                    continuing = False
+                    yield None, None
+
+                # As in FILENAME_LINENO_RE, the filename is everything before the first ":".
+                colon = warning_line.find(":")
+                basename = warning_line[warning_line.rfind(os.path.sep, 0, colon) + 1 : colon]
+                if basename not in changed_basenames and not warning_line.startswith(
+                    not_prefiltered
+                ):
+                    continue
+
+                should_output = False
+                location: tuple[str | None, int | None] = (None, None)
+
+                # Special case for Java exception in the output.
+                if warning_line.startswith("Exception in thread"):
+                    should_output = True
+
+                match = FILENAME_LINENO_RE.match(warning_line)
+                if match:
+                    try:
+                        filename = strip_dirs(match.group(1), strip_warnings)
+                    except TypeError:
+                        filename = "warnings filename above common directory"
+                        ## It's not an error; it just means this file doesn't appear in warnings.
+                        # eprint('Bad --strip-warnings={0} ; line has fewer "/": {1}'.format(
+                        #   strip_warnings, match.group(1)))
+                        # sys.exit(2)
+                    if check_absolute_paths and filename.startswith("/"):
+                        self.absolute_filename = filename
+                        check_absolute_paths = False
+                        not_prefiltered = ("Exception in thread",)
+                    lineno = int(match.group(2))
+                    location = (filename, lineno)
+                    if filename in changed and lineno in changed[filename]:
+                        should_output = True
+
+                if should_output:
+                    self.num_selected += 1
+                    continuing = True
+                    yield warning_line, location
+        finally:
+            self.continuing = continuing
+
+
+class WarningRecord:
+    """A warning that is about a changed line, as yielded by `WarningFilter.records`."""
+
+    __slots__ = ("filename", "hunk", "lineno", "lines")
+
+    def __init__(
+        self,
+        filename: str | None,
+        lineno: int | None,
+        hunk: tuple[int, int] | None,
+        lines: list[str],
+    ) -> None:
+        """Create a WarningRecord."""
+        # The filename in the warning, with `strip_warnings` leading directories stripped.
+        # None for a Java exception, which is always selected.
+        self.filename = filename
+        # The line number in the warning, or None for a Java exception.
+        self.lineno = lineno
+        # The first and last changed lines (including context lines) of the part of the
+        # diff that contains `lineno`, or None if the warning is not about a changed line.
+        self.hunk = hunk
+        # The lines of the warning:  the line that starts it and its continuation lines.
+        self.lines = lines
+
+    def text(self) -> str:
+        """Return the lines of the warning, as they appear in the warnings.
+
+        Returns:
+            the lines of the warning, concatenated.
+        """
+        return "".join(self.lines)
+
+
+def filter_warnings(
+    warning_lines: collections.abc.Iterable[str],
+    changed: ChangedLines,
+    strip_diff: int = 0,
+    strip_warnings: int = 0,
+    guess_strip: bool = False,
+    guess_strip_window: int = 1000,
+) -> collections.abc.Iterator[str]:
+    """Return an iterator over the warning lines that are about changed lines.
+
+    The arguments are like the command-line arguments of `lint-diff.py`.  If
+    `guess_strip` is true, `strip_diff` and `strip_warnings` are guessed:  from all the
+    warning lines if they are a sequence such as a list, and otherwise from the first
+    `guess_strip_window` distinct filenames in them.  The guess is made by this call,
+    not lazily.
+
+    Returns:
+        an iterator over the warning lines that are about changed lines.
+    """
+    if guess_strip:
+        if isinstance(warning_lines, collections.abc.Sequence):
+            guessed_strip = guess_strip_filenames(
+                changed.filenames(), warning_filenames(warning_lines)
+            )
+        else:
+            guessed_strip, warning_lines = guess_strip_stream(
+                changed.filenames(), iter(warning_lines), guess_strip_window
+            )
+        if guessed_strip[0] != 1000:
+            strip_diff, strip_warnings = guessed_strip[:2]
+    return WarningFilter(changed.strip(strip_diff), strip_warnings).filter(warning_lines)
+
+
+### Input
+
+
+# As an alternative, could use the `chardet` package, but I don't want external dependencies.
+def open_input(filename: str | os.PathLike[str]) -> TextIO:
+    """Open a file for reading.
+
+    Bytes that are not valid UTF-8 are not an error:  `input_lines` decodes
+    the lines that contain them as ISO-8859-1.  Thus, the file is read only
+    once, rather than once to determine its encoding and again to process it.
+    A compressed file is decompressed as it is read; see `decompress`.
+
+    Returns:
+        the open file.
+    """
+    # Not `Path.open`, because importing pathlib would make importing this module slower.
+    return decode_input(open(filename, "rb"))  # ruff:ignore[builtin-open]
+
+
+def decode_input(binary: BinaryIO) -> TextIO:
+    """Decode a binary file, such as `sys.stdin.buffer`, in the same way as `open_input` does.
+
+    `binary` must support `peek`, as buffered binary files do.  Closing the result closes `binary`.
+
+    Returns:
+        the decoded (and, if need be, decompressed) file.
+    """
+    decompressed = decompress(binary)
+    if decompressed is binary:
+        return io.TextIOWrapper(binary, encoding="utf-8", errors="surrogateescape")
+    return CompressedInput(decompressed, binary)
+
+
+class CompressedInput(io.TextIOWrapper):
+    """A compressed file, decompressed and decoded as it is read.  Returned by `decode_input`."""
+
+    def __init__(self, decompressed: BinaryIO, compressed: BinaryIO) -> None:
+        """Decode `decompressed`, which decompresses `compressed`."""
+        # The compressed file, which closing `decompressed` does not close.
+        self.compressed = compressed
+        super().__init__(decompressed, encoding="utf-8", errors="surrogateescape")
+
+    def seekable(self) -> bool:
+        """Return true if the file can be rewound, by decompressing it again from the start.
+
+        Returns:
+            true if the file can be rewound.
+        """
+        return self.compressed.seekable() and super().seekable()
+
+    def close(self) -> None:
+        """Close the file, and the compressed file."""
+        try:
+            super().close()
+        finally:
+            self.compressed.close()
+
+
+# The first bytes of each compressed format that `decompress` recognizes.
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"(\xb5/\xfd": "zstd",
+}
+
+
+def compression_format(head: bytes) -> str | None:
+    """Return the compressed format of a file that starts with `head`, or None if not compressed.
+
+    Returns:
+        "gzip", "bz2", "xz", "zstd", or None.
+    """
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def decompress(binary: BinaryIO) -> BinaryIO:
+    """Return a file that reads `binary`, decompressing it as it is read if it is compressed.
+
+    The format (gzip, bzip2, xz, or zstd) is determined from the first bytes of the
+    file, not from its name.  The data is decompressed as a stream, so no temporary
+    file is needed.  `binary` must support `peek`, as buffered binary files do.
+    Closing the result does not close `binary`.
+
+    Returns:
+        `binary` if it is not compressed; otherwise, a file that decompresses it.
+    """
+    compression = compression_format(binary.peek(6)[:6])
+    if compression is None:
+        return binary
+    return open_decompressor(compression, binary)
+
+
+def open_decompressor(compression: str, binary: BinaryIO) -> BinaryIO:
+    """Return a file that decompresses `binary`, which is in the given format.
+
+    The modules are imported only when needed, because most inputs are not compressed.
+    zstd requires Python 3.14 or later, or the `zstandard` package.
+
+    Returns:
+        a file that decompresses `binary`.
+    """
+    if compression == "gzip":
+        import gzip  # ruff:ignore[import-outside-top-level]
+
+        return gzip.GzipFile(fileobj=binary, mode="rb")
+    if compression == "bz2":
+        import bz2  # ruff:ignore[import-outside-top-level]
+
+        return bz2.BZ2File(binary)
+    if compression == "xz":
+        import lzma  # ruff:ignore[import-outside-top-level]
+
+        return lzma.LZMAFile(binary)
+    try:
+        from compression import zstd  # ruff:ignore[import-outside-top-level]
+    except ImportError:
+        pass
+    else:
+        return zstd.ZstdFile(binary)
+    try:
+        import zstandard  # ruff:ignore[import-outside-top-level]
+    except ImportError as err:
+        msg = "reading zstd-compressed input requires Python 3.14 or the zstandard package"
+        raise ImportError(msg) from err
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        binary, read_across_frames=True, closefd=False
+    )
+    return io.BufferedReader(reader)
+
+
+def decode_line(line: bytes) -> str:
+    """Decode a line in the same way as `open_input` and `input_lines` do.
+
+    Returns:
+        the line, decoded as UTF-8 (or ISO-8859-1 if it is not valid UTF-8), with its line
+        terminator translated to a newline.
+    """
+    if line.endswith(b"\r\n"):
+        line = line[:-2] + b"\n"
+    elif line.endswith(b"\r"):
+        line = line[:-1] + b"\n"
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError:
+        return line.decode("iso-8859-1")
+
+
+def input_lines(file: collections.abc.Iterable[str]) -> collections.abc.Iterator[str]:
+    """Yield each line of a file opened by `open_input` or `open_stdin`.
+
+    A line that is not valid UTF-8 is decoded as ISO-8859-1 instead.
+
+    Yields:
+        each line of the file.
+    """
+    for line in file:
+        if not line.isascii() and SURROGATE_RE.search(line):
+            yield line.encode("utf-8", "surrogateescape").decode("iso-8859-1")
+        else:
+            yield line
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""A local stand-in for the GitHub commit-status API, for testing ci-last-success.py.
+
+Usage:  stand-in-github.py [options] STATES_FILE PORT_FILE LOG_FILE
+
+STATES_FILE has lines of the form "SHA STATE".  A request for
+/repos/ORG/REPO/commits/SHA/status gets STATE, or "pending" (as from GitHub)
+if SHA is not in STATES_FILE.  As GitHub does, it sends an ETag header, and
+answers 304 (Not Modified) to a request whose If-None-Match header has the
+current ETag.  The server listens on a free port of 127.0.0.1, which it
+writes to PORT_FILE once it is ready.  For each request, it appends a line
+"METHOD PATH STATUS" to LOG_FILE.
+
+A request for /repos/ORG/REPO/actions/runs gets a listing of one workflow run
+for each SHA in STATES_FILE, in order (as from GitHub, newest first), with
+the given state as its conclusion; a SHA whose state is "pending" has none.
+The listing is in pages of the requested size (per_page), up to
+--per-page, linked by Link headers.  It exits on a POST to /shutdown, or after
+60 seconds without a request.
+
+Options: --rate-limit=N means to allow N requests per --rate-limit-window
+             seconds (default 1), counting as GitHub does:  a 304 response
+             does not count.  Responses have X-RateLimit-Remaining and
+             X-RateLimit-Reset headers, and requests over the limit get a 403
+             response.
+         --per-page=N is the largest page size for listings; default 100.
+         --fail-first=N means to answer the first N requests with a 502
+             (Bad Gateway) response.
+         --delay=SECONDS means to wait that long before answering each
+             commit-status request.  A request for /stats gets the largest
+             number of commit-status requests that were being answered at once.
+"""
+
+import argparse
+import http.server
+import json
+import math
+import re
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any
+
+# The server exits after this many seconds without a request.
+IDLE_SECONDS = 60
+
+STATUS_PATH_RE = re.compile(r"/repos/[^/]+/[^/]+/commits/([0-9a-f]+)/status")
+RUNS_PATH_RE = re.compile(r"/repos/[^/]+/[^/]+/actions/runs")
+
+
+def main() -> None:
+    """Serve requests until shut down or idle."""
+    parser = argparse.ArgumentParser(description="Serve commit statuses, as GitHub does")
+    parser.add_argument("--rate-limit", dest="rate_limit", type=int, default=None)
+    parser.add_argument("--rate-limit-window", dest="rate_limit_window", type=float, default=1)
+    parser.add_argument("--per-page", dest="per_page", type=int, default=100)
+    parser.add_argument("--fail-first", dest="fail_first", type=int, default=0)
+    parser.add_argument("--delay", dest="delay", type=float, default=0)
+    parser.add_argument("states_file", metavar="STATES_FILE")
+    parser.add_argument("port_file", metavar="PORT_FILE")
+    parser.add_argument("log_file", metavar="LOG_FILE")
+    args = parser.parse_args()
+    states = dict(line.split() for line in Path(args.states_file).read_text().splitlines())
+    server = StandInServer(states, Path(args.log_file))
+    server.rate_limit = args.rate_limit
+    server.rate_limit_window = args.rate_limit_window
+    server.failures_left = args.fail_first
+    server.max_per_page = args.per_page
+    server.delay = args.delay
+    Path(args.port_file).write_text(f"{server.server_address[1]}\n")
+    while not server.stopped and time.monotonic() - server.last_request_time < IDLE_SECONDS:
+        server.handle_request()
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """A server that answers commit-status requests from a fixed table of states."""
+
+    daemon_threads = True
+    # Requests are handled in other threads, so `main` polls for `stopped`.
+    timeout = 0.5
+
+    def __init__(self, states: dict[str, str], log_path: Path) -> None:
+        """Create a server on a free port."""
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.states = states
+        self.log_path = log_path
+        self.log_lock = threading.Lock()
+        self.stopped = False
+        self.last_request_time = time.monotonic()
+        # The requests allowed per window, or None for no limit, and how many remain in
+        # the window that ends at `reset_time`.
+        self.rate_limit: int | None = None
+        self.rate_limit_window = 1.0
+        self.remaining = 0
+        self.reset_time = 0.0
+        self.failures_left = 0
+        self.max_per_page = 100
+        # How long to wait before answering a commit-status request, how many are being
+        # answered, and the most that have been answered at once.
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def rate_limit_headers(self, counted: bool) -> tuple[bool, dict[str, str]]:
+        """Count a request against the rate limit, if `counted`.
+
+        Returns:
+            whether the request is within the limit, and the headers that report the limit.
+        """
+        if self.rate_limit is None:
+            return True, {}
+        with self.lock:
+            now = time.time()
+            if now >= self.reset_time:
+                self.remaining = self.rate_limit
+                self.reset_time = now + self.rate_limit_window
+            allowed = self.remaining > 0
+            if allowed and counted:
+                self.remaining -= 1
+            return allowed, {
+                "X-RateLimit-Remaining": str(self.remaining),
+                "X-RateLimit-Reset": str(math.ceil(self.reset_time)),
+            }
+
+    def fail(self) -> bool:
+        """Return true if this request should fail, per --fail-first.
+
+        Returns:
+            true if this request should fail.
+        """
+        with self.lock:
+            if self.failures_left == 0:
+                return False
+            self.failures_left -= 1
+            return True
+
+    def process_request(self, request: object, client_address: object) -> None:
+        """Note the time of the request, then handle it in a new thread."""
+        self.last_request_time = time.monotonic()
+        super().process_request(request, client_address)
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Answers one request."""
+
+    server: StandInServer
+
+    def do_GET(self) -> None:
+        """Answer a commit-status, workflow-run listing, or /stats request."""
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/stats":
+            self.send_json(200, {"max_in_flight": self.server.max_in_flight})
+            return
+        if RUNS_PATH_RE.fullmatch(url.path):
+            self.list_runs(urllib.parse.parse_qs(url.query))
+            return
+        match = STATUS_PATH_RE.fullmatch(self.path)
+        if match is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        if self.server.fail():
+            self.send_json(502, {"message": "Server Error"})
+            return
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        try:
+            time.sleep(self.server.delay)
+            self.answer_status(match.group(1))
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def answer_status(self, sha: str) -> None:
+        """Answer a commit-status request for `sha`."""
+        state = self.server.states.get(sha, "pending")
+        etag = f'"{sha}-{state}"'
+        not_modified = self.headers.get("If-None-Match") == etag
+        allowed, headers = self.server.rate_limit_headers(counted=not not_modified)
+        if not allowed:
+            self.send_json(403, {"message": "API rate limit exceeded"}, headers)
+        elif not_modified:
+            self.send_json(304, None, {"ETag": etag, **headers})
+        else:
+            self.send_json(200, {"state": state, "sha": sha}, {"ETag": etag, **headers})
+
+    def list_runs(self, query: dict[str, list[str]]) -> None:
+        """Answer a request for a page of the workflow-run listing."""
+        per_page = min(int(query.get("per_page", ["30"])[0]), self.server.max_per_page)
+        page = int(query.get("page", ["1"])[0])
+        runs = [
+            {"head_sha": sha, "status": "completed", "conclusion": state}
+            for sha, state in self.server.states.items()
+            if state != "pending"
+        ]
+        headers = {}
+        if page * per_page < len(runs):
+            next_query = urllib.parse.urlencode({**query, "page": page + 1}, doseq=True)
+            next_url = f"http://{self.headers['Host']}{urllib.parse.urlsplit(self.path).path}"
+            headers["Link"] = f'<{next_url}?{next_query}>; rel="next"'
+        page_runs = runs[(page - 1) * per_page : page * per_page]
+        self.send_json(200, {"total_count": len(runs), "workflow_runs": page_runs}, headers)
+
+    def do_POST(self) -> None:
+        """Shut down, if the request is for /shutdown."""
+        if self.path == "/shutdown":
+            self.send_json(200, {})
+            self.server.stopped = True
+        else:
+            self.send_json(404, {"message": "Not Found"})
+
+    def send_json(
+        self, status: int, body: dict[str, Any] | None, headers: dict[str, str] | None = None
+    ) -> None:
+        """Send a response, with a JSON body unless `body` is None, and log it."""
+        with self.server.log_lock, self.server.log_path.open("a") as log:
+            log.write(f"{self.command} {self.path} {status}\n")
+        content = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, message_format: str, *args: object) -> None:
+        """Do not log requests to standard error."""
+
+
+if __name__ == "__main__":
+    main()
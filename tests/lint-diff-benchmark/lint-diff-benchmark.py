@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""Benchmark the phases of lint-diff.py on large synthetic inputs.
+
+Usage: lint-diff-benchmark.py [options]
+
+Generates a diff and a warnings file, then times each phase of lint-diff.py:
+  * changed_lines:  reading and parsing the diff
+  * guess_strip:  the --guess-strip computation (guess_strip_files)
+  * filter:  filtering the warnings (WarningFilter.filter)
+For each phase it reports the wall time, the throughput, and the peak memory
+allocated by Python (measured by tracemalloc, in a separate run, because
+tracemalloc slows the code down).
+
+Options:
+  --diff-files=N        number of files in the diff (default 1000)
+  --hunks=M             number of hunks per file in the diff (default 10)
+  --warning-files=N     number of files with warnings (default 10000);
+                        the first --diff-files of them are the files in the diff
+  --warnings-per-file=N number of warnings per file (default 20)
+  --context=N           lines around each changed one that are also considered
+                        changed, as for lint-diff.py (default 2)
+  --layout=LAYOUT       "ab" if the diff's filenames start with a/ and b/ (as
+                        in `git diff` output), or "absolute" if they are
+                        absolute, like the filenames in the warnings (default "ab")
+  --repeat=N            time each phase N times and report the fastest (default 3)
+  --seed=N              seed for the random number generator (default 0)
+  --work-dir=DIR        where to write the generated inputs (default: a temporary
+                        directory, which is removed afterward)
+  --json                output JSON instead of a table
+  --save-baseline=FILE  write the results to FILE
+  --baseline=FILE       compare the results to those in FILE, which was written
+                        by --save-baseline with the same options
+  --threshold=FRACTION  with --baseline, the exit status is 1 if any phase's time
+                        or peak memory exceeds the baseline's by more than
+                        FRACTION (default 0.25)
+
+Timings depend on the machine, so a baseline is only meaningful on the machine
+that wrote it.
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+# lint-diff.py's library, lint_diff.py, is in the top-level directory.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import lint_diff
+
+# The directory that the warnings' absolute filenames are in.
+PROJECT_DIR = "/home/user/project"
+
+PHASES = ("changed_lines", "guess_strip", "filter")
+
+
+def main() -> None:
+    """Generate inputs, benchmark lint-diff.py, and compare to a baseline."""
+    args = parse_args()
+
+    if args.work_dir is None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmark(args, Path(work_dir))
+    else:
+        work_dir = Path(args.work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = run_benchmark(args, work_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.save_baseline is not None:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.baseline is not None:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command-line arguments.
+
+    Returns:
+        the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark lint-diff.py.")
+    parser.add_argument("--diff-files", type=int, default=1000)
+    parser.add_argument("--hunks", type=int, default=10)
+    parser.add_argument("--warning-files", type=int, default=10000)
+    parser.add_argument("--warnings-per-file", type=int, default=20)
+    parser.add_argument("--context", type=int, default=2)
+    parser.add_argument("--layout", choices=("ab", "absolute"), default="ab")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    args.warning_files = max(args.warning_files, args.diff_files)
+    return args
+
+
+### Input generators
+
+
+def source_filenames(num_files: int, rand: random.Random) -> list[str]:
+    """Return relative filenames in a Gradle-style multi-module Java project.
+
+    Returns:
+        `num_files` distinct relative filenames.
+    """
+    result = []
+    for i in range(num_files):
+        module = f"module{rand.randrange(max(1, num_files // 500))}"
+        package = "/".join(f"pkg{rand.randrange(10)}" for _ in range(rand.randint(1, 4)))
+        result.append(f"{module}/src/main/java/org/example/{package}/Class{i}.java")
+    return result
+
+
+def generate_diff(
+    filenames: list[str], num_hunks: int, layout: str, rand: random.Random, out: io.TextIOBase
+) -> None:
+    """Write, to `out`, a unified diff (with 3 lines of context) that changes each file.
+
+    `layout` is as for the --layout command-line option.
+    """
+    for filename in filenames:
+        if layout == "ab":
+            old_name, new_name = f"a/{filename}", f"b/{filename}"
+        else:
+            old_name = new_name = f"{PROJECT_DIR}/{filename}"
+        out.write(f"diff --git {old_name} {new_name}\n")
+        out.write(f"--- {old_name}\n+++ {new_name}\n")
+        # The number of lines that the new file has, minus the number the old file has,
+        # before the current hunk.
+        offset = 0
+        lineno = 1
+        for _ in range(num_hunks):
+            lineno += rand.randint(10, 100)
+            removed = rand.randint(0, 5)
+            added = rand.randint(0 if removed else 1, 5)
+            out.write(
+                f"@@ -{lineno},{removed + 6} +{lineno + offset},{added + 6} @@ class Foo {{\n"
+            )
+            out.writelines(f"     context line {lineno + i}\n" for i in range(3))
+            out.writelines(f"-    removed line {i}\n" for i in range(removed))
+            out.writelines(f"+    added line {i}\n" for i in range(added))
+            out.writelines(f"     context line {lineno + removed + i}\n" for i in range(3, 6))
+            lineno += removed + 6
+            offset += added - removed
+
+
+def generate_warnings(
+    filenames: list[str], warnings_per_file: int, rand: random.Random, out: io.TextIOBase
+) -> None:
+    """Write, to `out`, javac and Gradle output with warnings about the given files.
+
+    Most warnings are followed by continuation lines (the source line and a caret).
+    """
+    out.write("> Task :compileJava\n")
+    for filename in filenames:
+        for _ in range(warnings_per_file):
+            lineno = rand.randint(1, 2000)
+            out.write(
+                f"{PROJECT_DIR}/{filename}:{lineno}: warning: [rawtypes] found raw type: List\n"
+            )
+            if rand.random() < 0.8:
+                out.write("        List list = new ArrayList<>();\n")
+                out.write("        ^\n")
+                out.write("  missing type arguments for generic class List<E>\n")
+        if rand.random() < 0.01:
+            out.write("> Task :compileTestJava\n")
+    out.write(f"{len(filenames) * warnings_per_file} warnings\n")
+    out.write('Exception in thread "main" java.lang.IllegalStateException: example\n')
+    out.write("\tat org.example.Main.main(Main.java:10)\n")
+    out.write("\n* What went wrong:\nExecution failed for task ':compileJava'.\n")
+
+
+### Benchmarking
+
+
+def run_benchmark(args: argparse.Namespace, work_dir: Path) -> dict[str, Any]:
+    """Generate the inputs in `work_dir` and benchmark each phase of lint-diff.py.
+
+    Returns:
+        a JSON-serializable dictionary with the options and, for each phase, its
+        time, throughput, and peak memory.
+    """
+    rand = random.Random(args.seed)
+    warning_filenames = source_filenames(args.warning_files, rand)
+    diff_filenames = warning_filenames[: args.diff_files]
+    rand.shuffle(warning_filenames)
+
+    diff_path = work_dir / "benchmark.diff"
+    warnings_path = work_dir / "benchmark-warnings.txt"
+    with diff_path.open("w") as out:
+        generate_diff(diff_filenames, args.hunks, args.layout, rand, out)
+    with warnings_path.open("w") as out:
+        generate_warnings(warning_filenames, args.warnings_per_file, rand, out)
+
+    # The result of each phase, which is the input to the next one.
+    changed: list[lint_diff.ChangedLines] = []
+    strips: list[tuple[int, int, str, str]] = []
+    # The number of output lines of the filter phase.
+    output_lines: list[int] = []
+
+    def run_changed_lines() -> None:
+        result = lint_diff.ChangedLines.from_path(diff_path, args.context)
+        changed.clear()
+        changed.append(result)
+
+    def run_guess_strip() -> None:
+        with lint_diff.open_input(warnings_path) as warnings:
+            strip = lint_diff.guess_strip_files(changed[0].filenames(), warnings)
+        strips.clear()
+        strips.append(strip)
+
+    def run_filter() -> None:
+        strip_diff, strip_warnings = strips[0][:2]
+        warning_filter = lint_diff.WarningFilter(changed[0].strip(strip_diff), strip_warnings)
+        with lint_diff.open_input(warnings_path) as warnings:
+            for _ in warning_filter.filter(lint_diff.input_lines(warnings)):
+                pass
+        output_lines.clear()
+        output_lines.append(warning_filter.num_selected)
+
+    diff_size = file_size_and_lines(diff_path)
+    warnings_size = file_size_and_lines(warnings_path)
+    phases = {}
+    for phase, function, (num_bytes, num_lines) in (
+        ("changed_lines", run_changed_lines, diff_size),
+        ("guess_strip", run_guess_strip, warnings_size),
+        ("filter", run_filter, warnings_size),
+    ):
+        seconds, peak_bytes = measure(function, args.repeat)
+        phases[phase] = {
+            "seconds": seconds,
+            "input_bytes": num_bytes,
+            "input_lines": num_lines,
+            "megabytes_per_second": num_bytes / 1e6 / seconds,
+            "lines_per_second": num_lines / seconds,
+            "peak_memory_bytes": peak_bytes,
+        }
+
+    return {
+        "options": {
+            "diff_files": args.diff_files,
+            "hunks": args.hunks,
+            "warning_files": args.warning_files,
+            "warnings_per_file": args.warnings_per_file,
+            "context": args.context,
+            "layout": args.layout,
+            "seed": args.seed,
+        },
+        "guessed_strip": list(strips[0][:2]),
+        "output_lines": output_lines[0],
+        "phases": phases,
+    }
+
+
+def file_size_and_lines(path: Path) -> tuple[int, int]:
+    """Return the size of a file in bytes, and its number of lines.
+
+    Returns:
+        the size of the file and its number of lines.
+    """
+    with path.open("rb") as file:
+        return path.stat().st_size, sum(1 for _ in file)
+
+
+def measure(function: Callable[[], None], repeat: int) -> tuple[float, int]:
+    """Return the shortest time of `repeat` calls to `function`, and its peak memory use.
+
+    Returns:
+        the shortest time in seconds, and the peak memory that Python allocated, in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def print_table(results: dict[str, Any]) -> None:
+    """Print the results of `run_benchmark` in human-readable form."""
+    print(f"options: {results['options']}")
+    print(f"guessed strip: {results['guessed_strip']}; {results['output_lines']} output lines")
+    print(f"{'phase':<14}{'seconds':>10}{'MB':>10}{'MB/s':>10}{'lines/s':>12}{'peak MiB':>10}")
+    for phase, result in results["phases"].items():
+        print(
+            f"{phase:<14}{result['seconds']:>10.3f}{result['input_bytes'] / 1e6:>10.1f}"
+            f"{result['megabytes_per_second']:>10.1f}{result['lines_per_second']:>12.0f}"
+            f"{result['peak_memory_bytes'] / 2**20:>10.1f}"
+        )
+
+
+def compare_to_baseline(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[str]:
+    """Compare the results of `run_benchmark` to a baseline that it produced earlier.
+
+    Returns:
+        a message for each phase whose time or peak memory exceeds that of the baseline
+        by more than the fraction `threshold`.
+    """
+    if results["options"] != baseline["options"]:
+        return [f"baseline options {baseline['options']} differ from {results['options']}"]
+    regressions = []
+    for phase in PHASES:
+        for measurement in ("seconds", "peak_memory_bytes"):
+            old = baseline["phases"][phase][measurement]
+            new = results["phases"][phase][measurement]
+            if new > old * (1 + threshold):
+                regressions.append(
+                    f"regression: {phase} {measurement} was {old:.6g}, is {new:.6g}"
+                    f" ({(new / old - 1) * 100:+.0f}%)"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
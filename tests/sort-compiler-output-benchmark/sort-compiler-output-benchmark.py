@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""Benchmark the sort keys of sort-compiler-output on large synthetic logs.
+
+Usage: sort-compiler-output-benchmark.py [options]
+
+Generates javac-style errors about files in a deep directory tree, then
+times, for each way of ordering filenames:
+  * key:  computing the sort key of every error (error_sort_key)
+  * sort:  sorting the errors and removing duplicates (sort_errors and unique)
+The orderings are:
+  * string:  filenames sorted as strings (the default)
+  * directory:  --directory-order, whose key is cached per filename
+  * directory-uncached:  --directory-order, computing the key of each
+    error's filename anew, to show what the cache saves
+
+Options:
+  --files=N     number of distinct files with errors (default 3000)
+  --errors=N    number of errors (default 300000)
+  --repeat=N    time each measurement N times and report the fastest (default 3)
+  --seed=N      seed for the random number generator (default 0)
+  --json        output JSON instead of a table
+
+Timings depend on the machine, so compare only results from the same machine.
+"""
+
+import argparse
+import importlib.machinery
+import importlib.util
+import json
+import random
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+ORDERINGS = ("string", "directory", "directory-uncached")
+
+
+def main() -> None:
+    """Generate errors and benchmark the sort keys of sort-compiler-output."""
+    args = parse_args()
+    results = run_benchmark(args, load_sort_compiler_output())
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command-line arguments.
+
+    Returns:
+        the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the sort keys of sort-compiler-output.")
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--errors", type=int, default=300000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args()
+
+
+def load_sort_compiler_output() -> ModuleType:
+    """Load sort-compiler-output, from the top-level directory, as a module.
+
+    Returns:
+        the module.
+    """
+    path = Path(__file__).resolve().parents[2] / "sort-compiler-output"
+    loader = importlib.machinery.SourceFileLoader("sort_compiler_output", str(path))
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    assert spec is not None
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def generate_errors(num_files: int, num_errors: int, rand: random.Random) -> list[str]:
+    """Return javac-style errors about files in a multi-module Java project.
+
+    Most errors are followed by continuation lines (the source line and a caret).
+
+    Returns:
+        `num_errors` errors, about `num_files` distinct files, in random order.
+    """
+    filenames = []
+    for i in range(num_files):
+        module = f"module{rand.randrange(max(1, num_files // 500))}"
+        package = "/".join(f"pkg{rand.randrange(10)}" for _ in range(rand.randint(1, 4)))
+        filenames.append(f"{module}/src/main/java/org/example/{package}/Class{i}.java")
+    errors = []
+    for _ in range(num_errors):
+        error = (
+            f"{rand.choice(filenames)}:{rand.randint(1, 2000)}:{rand.randint(1, 80)}:"
+            " warning: [rawtypes] found raw type: List\n"
+        )
+        if rand.random() < 0.8:
+            error += "        List list = new ArrayList<>();\n        ^\n"
+        errors.append(error)
+    return errors
+
+
+def run_benchmark(args: argparse.Namespace, sco: ModuleType) -> dict[str, Any]:
+    """Benchmark computing keys and sorting, for each ordering.
+
+    Returns:
+        a JSON-serializable dictionary with the options and, for each ordering and
+        measurement, its time and throughput.
+    """
+    errors = generate_errors(args.files, args.errors, random.Random(args.seed))
+    cached_key = sco.directory_order_key
+
+    results: dict[str, Any] = {
+        "options": {"files": args.files, "errors": args.errors, "seed": args.seed},
+        "orderings": {},
+    }
+    for ordering in ORDERINGS:
+        directory_order = ordering != "string"
+        # error_sort_key looks up directory_order_key when it is called.
+        sco.directory_order_key = (
+            cached_key.__wrapped__ if ordering == "directory-uncached" else cached_key
+        )
+
+        def run_key(directory_order: bool = directory_order) -> None:
+            cached_key.cache_clear()
+            for error in errors:
+                sco.error_sort_key(error, directory_order)
+
+        def run_sort(directory_order: bool = directory_order) -> None:
+            cached_key.cache_clear()
+            for _ in sco.unique(sco.sort_errors(errors, None, directory_order)):
+                pass
+
+        results["orderings"][ordering] = {
+            measurement: {"seconds": seconds, "errors_per_second": args.errors / seconds}
+            for measurement, function in (("key", run_key), ("sort", run_sort))
+            for seconds in [measure(function, args.repeat)]
+        }
+    sco.directory_order_key = cached_key
+    return results
+
+
+def measure(function: Callable[[], None], repeat: int) -> float:
+    """Return the shortest time of `repeat` calls to `function`.
+
+    Returns:
+        the shortest time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def print_table(results: dict[str, Any]) -> None:
+    """Print the results of `run_benchmark` in human-readable form."""
+    print(f"options: {results['options']}")
+    print(f"{'ordering':<20}{'key s':>10}{'key errors/s':>14}{'sort s':>10}{'sort errors/s':>15}")
+    for ordering, result in results["orderings"].items():
+        key, sort = result["key"], result["sort"]
+        print(
+            f"{ordering:<20}{key['seconds']:>10.3f}{key['errors_per_second']:>14.0f}"
+            f"{sort['seconds']:>10.3f}{sort['errors_per_second']:>15.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()